@@ -32,7 +32,8 @@ Radio Sources
 -------------
 Relating flux, antenna temperature, etc.::
 
-   flux(Tb,freq,angular_diameter)
+   beam_coupling(source_size,beamwidth,shape)
+   flux(Tb,freq,angular_diameter,beamwidth)
    janskyPQ(Jy)
 
 Conversions
@@ -59,9 +60,14 @@ Miscellaneous
 -------------
 Left-overs::
 
+   angular_separation(ra1,dec1,ra2,dec2)
+   datetime_to_seconds(date)
    freq_to_chan(frequency,bandwidth,n_chans)
+   freqs_to_chans(frequency,bandwidth,n_chans)
+   sky_frequency(velocity,rest_frequency,convention)
 
 """
+import calendar
 import os
 import math
 try:
@@ -165,6 +171,265 @@ class Dipole():
                          - numpy.sin(x)*(2*Ci - CiTwo - Cia))
     return R, X
 
+  def _pattern(self, theta, wvln):
+    """
+    Field pattern and half the electrical length kL/2
+
+    The cosine and sine of theta are computed once.
+    """
+    wvln = numpy.asarray(wvln, dtype=float)
+    half_kL = math.pi*self.length*wavenumber(wvln)
+    cos_theta = numpy.cos(theta)
+    sin_theta = numpy.sin(theta)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+      F = (numpy.cos(half_kL*cos_theta) - numpy.cos(half_kL))/sin_theta
+    # along the axis the field vanishes
+    F = numpy.where(sin_theta == 0, 0., F)
+    return F, half_kL
+
+  def _over_phi(self, values, phi):
+    """
+    Repeat values which do not depend on phi over the phi grid
+
+    This is done last so that the rest of the work is done on the smaller
+    (theta, wavelength) grid.
+    """
+    if phi is None:
+      return values
+    return values*numpy.ones(numpy.shape(phi))
+
+  def pattern(self, theta, wvln, phi=None):
+    """
+    Far-field pattern of a centre-fed dipole with a sinusoidal current
+
+    This is the magnitude of E_theta in units of eta*I/(2*pi*r), where I is
+    the current maximum, i.e.::
+
+      F = (cos(kL/2 cos(theta)) - cos(kL/2))/sin(theta)
+
+    The pattern does not depend on phi, which is accepted so that the
+    arguments can be grids broadcast against each other, e.g.
+    theta[:,None,None], phi[None,:,None] and wvln[None,None,:].
+
+    @param theta : angle from the dipole axis (rad)
+    @type  theta : (numpy array of) float
+
+    @param wvln : wavelength (m)
+    @type  wvln : (numpy array of) float
+
+    @param phi : azimuth around the dipole axis (rad)
+    @type  phi : (numpy array of) float
+
+    @return: numpy array
+    """
+    return self._over_phi(self._pattern(theta, wvln)[0], phi)
+
+  def directivity(self, theta, wvln, Z=376.73, phi=None):
+    """
+    Directivity of the dipole in a direction
+
+    D = Z F^2/(pi R_r), where F is the pattern() and R_r the radiation
+    resistance referred to the current maximum, i.e. the input resistance
+    from impedance() times sin^2(kL/2).  A half-wave dipole gives 1.64
+    broadside.
+
+    @param theta : angle from the dipole axis (rad)
+    @type  theta : (numpy array of) float
+
+    @param wvln : wavelength (m)
+    @type  wvln : (numpy array of) float
+
+    @param Z : impedance of the medium, 376.73 ohm for free space
+
+    @param phi : azimuth around the dipole axis (rad)
+    @type  phi : (numpy array of) float
+
+    @return: numpy array
+    """
+    F, half_kL = self._pattern(theta, wvln)
+    R = self.impedance(wvln, Z)[0]
+    R_r = R*numpy.sin(half_kL)**2
+    return self._over_phi(Z*F*F/(math.pi*R_r), phi)
+
+  def effective_area(self, theta, wvln, Z=376.73, phi=None):
+    """
+    Effective area of the lossless dipole in a direction, D wvln^2/(4 pi)
+
+    @param theta : angle from the dipole axis (rad)
+    @type  theta : (numpy array of) float
+
+    @param wvln : wavelength (m)
+    @type  wvln : (numpy array of) float
+
+    @param Z : impedance of the medium, 376.73 ohm for free space
+
+    @param phi : azimuth around the dipole axis (rad)
+    @type  phi : (numpy array of) float
+
+    @return: numpy array (m^2)
+    """
+    wvln = numpy.asarray(wvln, dtype=float)
+    D = self.directivity(theta, wvln, Z)
+    return self._over_phi(D*wvln*wvln/(4*math.pi), phi)
+
+class DipoleArray():
+  """
+  Array of identical parallel dipoles
+
+  The dipoles lie along the z axis, side by side, with their centres at
+  positions in the x-y plane.  Angles are as for Dipole: theta from the
+  z axis and phi from the x axis.
+  """
+  def __init__(self, dipole, positions):
+    """
+    Create a dipole array instance
+
+    @param dipole : the element
+    @type  dipole : Dipole instance
+
+    @param positions : x positions (m), or (x,y) pairs (m), of the elements
+    @type  positions : array of float, shape (N,) or (N,2)
+    """
+    positions = numpy.array(positions, dtype=float)
+    if positions.ndim == 1:
+      positions = numpy.column_stack((positions, numpy.zeros(len(positions))))
+    self.dipole = dipole
+    self.positions = positions
+    self.n_elements = len(positions)
+    # each spacing occurs only once however often it appears in the array,
+    # e.g. N-1 times for a regular linear array
+    upper = numpy.triu_indices(self.n_elements, 1)
+    distance = numpy.hypot(*(positions[upper[0]] - positions[upper[1]]).T)
+    self.spacings, inverse = numpy.unique(numpy.round(distance, 9),
+                                          return_inverse=True)
+    self._upper = upper
+    self._spacing_index = inverse.ravel()
+
+  def _mutual_terms(self, wvln, Z):
+    """
+    Mutual impedance of two side-by-side dipoles at each distinct spacing
+
+    Induced EMF method for half-wave elements (Balanis, Antenna Theory,
+    eq. 8-71); shape (wavelengths, spacings).
+    """
+    from scipy.special import sici
+    k = 2*math.pi*wavenumber(wvln)[:,None]
+    L = self.dipole.length
+    d = self.spacings[None,:]
+    root = numpy.sqrt(d*d + L*L)
+    Si0, Ci0 = sici(k*d)
+    Si1, Ci1 = sici(k*(root + L))
+    Si2, Ci2 = sici(k*(root - L))
+    R = (Z/(4*math.pi))*(2*Ci0 - Ci1 - Ci2)
+    X = -(Z/(4*math.pi))*(2*Si0 - Si1 - Si2)
+    return R + 1j*X
+
+  def impedance_matrix(self, wvln, Z=376.73):
+    """
+    Self and mutual impedances of the elements
+
+    The diagonal is Dipole.impedance().  The off-diagonal terms assume
+    elements close to half a wavelength long; they are computed once for
+    each distinct spacing and the matrix is filled by symmetry.
+
+    @param wvln : wavelength(s) (m)
+    @type  wvln : (numpy array of) float
+
+    @param Z : impedance of the medium, 376.73 ohm for free space
+
+    @return: complex array, shape (N,N), or (wavelengths,N,N) for an array
+    """
+    wvln = numpy.asarray(wvln, dtype=float)
+    waves = numpy.atleast_1d(wvln)
+    matrix = numpy.empty((len(waves), self.n_elements, self.n_elements),
+                         dtype=complex)
+    R, X = self.dipole.impedance(waves, Z)
+    index = numpy.arange(self.n_elements)
+    matrix[:, index, index] = (R + 1j*X)[:,None]
+    if self.n_elements > 1:
+      mutual = self._mutual_terms(waves, Z)[:, self._spacing_index]
+      matrix[:, self._upper[0], self._upper[1]] = mutual
+      matrix[:, self._upper[1], self._upper[0]] = mutual
+    if wvln.ndim == 0:
+      return matrix[0]
+    return matrix
+
+  def currents(self, wvln, voltages=None, Z=376.73):
+    """
+    Feed currents for given feed voltages, solving Z I = V
+
+    @param wvln : wavelength(s) (m)
+    @type  wvln : (numpy array of) float
+
+    @param voltages : complex feed voltages (V); default: all 1
+    @type  voltages : array, shape (N,) or (wavelengths,N)
+
+    @param Z : impedance of the medium, 376.73 ohm for free space
+
+    @return: complex array, shape (N,), or (wavelengths,N) for an array
+    """
+    matrix = self.impedance_matrix(wvln, Z)
+    if voltages is None:
+      voltages = numpy.ones(self.n_elements)
+    voltages = numpy.broadcast_to(numpy.asarray(voltages, dtype=complex),
+                                  matrix.shape[:-1])
+    return numpy.linalg.solve(matrix, voltages[...,None])[...,0]
+
+  def active_impedance(self, wvln, voltages=None, Z=376.73):
+    """
+    Impedance seen at each feed with all the elements driven, V/I
+
+    All the wavelengths are solved in one batched call.
+
+    @param wvln : wavelength(s) (m)
+    @type  wvln : (numpy array of) float
+
+    @param voltages : complex feed voltages (V); default: all 1
+    @type  voltages : array, shape (N,) or (wavelengths,N)
+
+    @param Z : impedance of the medium, 376.73 ohm for free space
+
+    @return: complex array, shape (N,), or (wavelengths,N) for an array
+    """
+    I = self.currents(wvln, voltages, Z)
+    if voltages is None:
+      voltages = numpy.ones(self.n_elements)
+    return numpy.asarray(voltages, dtype=complex)/I
+
+  def array_factor(self, theta, phi, wvln, weights=None):
+    """
+    Array factor, the sum of the element weights times their phases
+
+    theta, phi and wvln broadcast against each other.
+
+    @param theta : angle from the z axis (rad)
+    @type  theta : (numpy array of) float
+
+    @param phi : azimuth from the x axis (rad)
+    @type  phi : (numpy array of) float
+
+    @param wvln : wavelength (m)
+    @type  wvln : (numpy array of) float
+
+    @param weights : complex element excitations, e.g. from currents();
+                     default: all 1
+    @type  weights : array of complex, shape (N,)
+
+    @return: complex numpy array
+    """
+    if weights is None:
+      weights = numpy.ones(self.n_elements)
+    theta, phi, wvln = numpy.broadcast_arrays(theta, phi, wvln)
+    shape = theta.shape
+    k = 2*math.pi*wavenumber(numpy.asarray(wvln, dtype=float).ravel())
+    sin_theta = numpy.sin(theta.ravel())
+    u = k*sin_theta*numpy.cos(phi.ravel())
+    v = k*sin_theta*numpy.sin(phi.ravel())
+    phase = numpy.outer(u, self.positions[:,0]) \
+            + numpy.outer(v, self.positions[:,1])
+    return (numpy.exp(1j*phase) @ numpy.asarray(weights, dtype=complex)) \
+           .reshape(shape)
+
 
 
 # ------------------------ global methods --------------------------
@@ -449,10 +714,14 @@ def forward_gain(aperture_efficiency, geometrical_area, wavelength):
   """
   return dB(directivity(aperture_efficiency, geometrical_area, wavelength))
 
-def flux(Tb,freq,angular_diameter):
+def flux(Tb,freq,angular_diameter,beamwidth=None):
   """
   Flux received from a source
 
+  Without a beamwidth this is the total flux of a uniform disk.  With one,
+  it is the flux of a point source which would give the same antenna
+  temperature, i.e. the total flux times beam_coupling() for a disk.
+
   @param Tb : brightness temperature in K
   @type  Tb : float
 
@@ -462,11 +731,53 @@ def flux(Tb,freq,angular_diameter):
   @param angular_diameter : source diameter in radians
   @type  angular_diameter : float
 
+  @param beamwidth : half-power beamwidth in radians, e.g. from HPBW()
+  @type  beamwidth : float
+
   @return: flux in Jy
   """
   I = BB_intensity(Tb,freq*1e9)
   solid_angle = math.pi*(angular_diameter/2)**2 # small angle approximation
-  return I*solid_angle/Jy
+  S = I*solid_angle/Jy
+  if beamwidth is not None:
+    S = S*beam_coupling(angular_diameter, beamwidth, "disk")
+  return S
+
+def beam_coupling(source_size, beamwidth, shape="disk"):
+  """
+  Fraction of the flux of an extended source seen by a Gaussian beam
+
+  This is the ratio of the antenna temperature of a source to that of a
+  point source with the same flux.  For a uniform disk of diameter d in a
+  beam with half-power width b it is (1 - exp(-x))/x with x = ln2 (d/b)^2;
+  for a Gaussian source with half-power width s it is b^2/(b^2 + s^2).  See
+  e.g. Baars, "The Paraboloidal Reflector Antenna in Radio Astronomy and
+  Communication" (2007), sec. 7.3.
+
+  The arguments broadcast against each other like numpy arrays.
+
+  @param source_size : disk diameter or Gaussian half-power width
+  @type  source_size : (numpy array of) float
+
+  @param beamwidth : beam half-power width, in the same units
+  @type  beamwidth : (numpy array of) float
+
+  @param shape : "disk" or "gaussian"
+  @type  shape : str
+
+  @return: coupling factor, between 0 and 1
+  """
+  ratio2 = numpy.square(numpy.divide(source_size, beamwidth, dtype=float))
+  if shape == "gaussian":
+    return 1./(1. + ratio2)
+  elif shape == "disk":
+    x = math.log(2)*ratio2
+    with numpy.errstate(invalid='ignore'):
+      K = -numpy.expm1(-x)/x
+    # the limit for a point source
+    return numpy.where(x == 0, 1., K)[()]
+  else:
+    raise RuntimeError("unknown source shape: "+str(shape))
 
 def freq_to_chan(frequency,bandwidth,n_chans):
     """
@@ -487,6 +798,33 @@ def freq_to_chan(frequency,bandwidth,n_chans):
       raise RuntimeError("that frequency is too high.")
     return round(float(frequency)/bandwidth*n_chans) % n_chans
 
+def freqs_to_chans(frequency,bandwidth,n_chans):
+  """
+  Channel numbers for an array of frequencies.
+
+  This is the array version of ``freq_to_chan``.  Instead of raising an
+  exception, a frequency outside the band, or NaN, gets channel -1.
+
+  @param frequency : same units as bandwidth
+  @type  frequency : (numpy array of) float
+
+  @param bandwidth : same units as frequency
+  @type  bandwidth : (numpy array of) float
+
+  @param n_chans : number of channels in the band
+  @type  n_chans : (numpy array of) int
+
+  @return: numpy array of int
+  """
+  frequency = numpy.asarray(frequency, dtype=float)
+  frequency = numpy.where(frequency < 0, bandwidth + frequency, frequency)
+  outside = (frequency < 0) | (frequency > bandwidth)
+  with numpy.errstate(invalid='ignore', divide='ignore'):
+    chans = numpy.round(frequency/bandwidth*n_chans) % n_chans
+  # NaN would become INT_MIN in the cast
+  outside |= ~numpy.isfinite(chans)
+  return numpy.where(outside, -1, chans).astype(int)
+
 def gain(dB):
   """
   Convert dB into gain
@@ -670,6 +1008,40 @@ def delta_f(delta_v,frequency):
   """
   return (delta_v/Physics.c)*frequency
 
+def sky_frequency(velocity, rest_frequency, convention="radio"):
+  """
+  Observed frequency of a spectral line from a moving source.
+
+  The velocity conventions are::
+    radio        f = f0*(1 - v/c)
+    optical      f = f0/(1 + v/c)
+    relativistic f = f0*sqrt((1 - v/c)/(1 + v/c))
+
+  The arguments broadcast against each other like numpy arrays, so, for
+  example, a column of velocities and a row of rest frequencies give a
+  table of sky frequencies.
+
+  @param velocity : velocity away from the observer in m/s
+  @type  velocity : (numpy array of) float
+
+  @param rest_frequency : rest frequency in Hz
+  @type  rest_frequency : (numpy array of) float
+
+  @param convention : 'radio', 'optical' or 'relativistic'
+  @type  convention : str
+
+  @return: frequency in Hz
+  """
+  beta = numpy.asarray(velocity, dtype=float)/Physics.c
+  if convention == "radio":
+    return rest_frequency*(1 - beta)
+  elif convention == "optical":
+    return rest_frequency/(1 + beta)
+  elif convention == "relativistic":
+    return rest_frequency*numpy.sqrt((1 - beta)/(1 + beta))
+  else:
+    raise RuntimeError("unknown velocity convention "+str(convention))
+
 def standing_wave_spectrum(length, dielectric_constant):
   """
   Frequency interval between peaks in a spectral pattern from a standing wave
@@ -688,3 +1060,44 @@ def standing_wave_spectrum(length, dielectric_constant):
   @return: float (Hz)
   """
   return c/(math.sqrt(dielectric_constant)*2*length)
+
+
+def angular_separation(ra1, dec1, ra2, dec2):
+  """
+  Angle between two directions on the sky
+
+  This uses the Vincenty formula, which is accurate at all separations.
+  The arguments broadcast against each other like numpy arrays.
+
+  @param ra1 : right ascension (or longitude) of the first direction (rad)
+  @type  ra1 : (numpy array of) float
+
+  @param dec1 : declination (or latitude) of the first direction (rad)
+  @type  dec1 : (numpy array of) float
+
+  @param ra2 : right ascension (or longitude) of the second direction (rad)
+  @type  ra2 : (numpy array of) float
+
+  @param dec2 : declination (or latitude) of the second direction (rad)
+  @type  dec2 : (numpy array of) float
+
+  @return: separation in radians
+  """
+  delta_ra = numpy.subtract(ra2, ra1)
+  sin_dra, cos_dra = numpy.sin(delta_ra), numpy.cos(delta_ra)
+  sin_d1, cos_d1 = numpy.sin(dec1), numpy.cos(dec1)
+  sin_d2, cos_d2 = numpy.sin(dec2), numpy.cos(dec2)
+  x = cos_d2*sin_dra
+  y = cos_d1*sin_d2 - sin_d1*cos_d2*cos_dra
+  return numpy.arctan2(numpy.hypot(x, y), sin_d1*sin_d2 + cos_d1*cos_d2*cos_dra)
+
+def datetime_to_seconds(date):
+  """
+  Seconds since 1970 of a datetime; naive datetimes are taken to be UT
+
+  @param date : date and time
+  @type  date : datetime.datetime() instance
+
+  @return: float
+  """
+  return calendar.timegm(date.utctimetuple()) + date.microsecond*1e-6
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Module async_lookup provides asyncio versions of the calibrator and flux
+look-ups, which otherwise block the event loop on file and network I/O.
+
+The blocking functions run in a shared thread pool of at most
+``max_workers`` threads, however many coroutines are waiting, so
+``asyncio.gather`` over hundreds of sources does not create hundreds of
+threads.  Concurrent requests with identical arguments share a single
+computation::
+
+ In [1]: import asyncio, datetime
+ In [2]: from Radio_Astronomy.async_lookup import *
+ In [3]: date = datetime.datetime.now()
+ In [4]: asyncio.run(gather_calibrator_fluxes(['3C286', 'Venus'], 8.4, date))
+ Out[4]: [(..., 'Quasar'), (..., 'Planet')]
+
+The radio_flux, vla_cal and michigan modules are imported when first used,
+so this module can be imported where only some of them are available.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+module_logger = logging.getLogger(__name__)
+
+max_workers = min(8, (os.cpu_count() or 1) + 4)
+
+_executor = None
+_in_flight = {}
+
+def set_max_workers(n_threads):
+  """
+  Change the size of the thread pool
+
+  Work already submitted finishes in the old pool.
+
+  @param n_threads : maximum number of threads
+  @type  n_threads : int
+  """
+  global max_workers, _executor
+  max_workers = n_threads
+  if _executor is not None:
+    _executor.shutdown(wait=False)
+    _executor = None
+
+def _get_executor():
+  global _executor
+  if _executor is None:
+    _executor = ThreadPoolExecutor(max_workers=max_workers,
+                                   thread_name_prefix='Radio_Astronomy')
+  return _executor
+
+def _request_key(func, args):
+  """
+  Hashable key for a request, None if the arguments cannot be hashed
+  """
+  key_args = tuple(tuple(arg) if isinstance(arg, list) else arg
+                   for arg in args)
+  try:
+    hash(key_args)
+  except TypeError:
+    return None
+  return (func, key_args)
+
+async def run_blocking(func, *args):
+  """
+  Run a blocking function in the thread pool
+
+  If an identical request is already running in this event loop, its
+  result is awaited instead of starting another.  Cancelling one waiter
+  does not cancel the shared computation.
+
+  @param func : function to call
+  @type  func : callable
+
+  @return: whatever func returns
+  """
+  loop = asyncio.get_running_loop()
+  key = _request_key(func, args)
+  if key is None:
+    return await loop.run_in_executor(_get_executor(), func, *args)
+  key = (loop,) + key
+  future = _in_flight.get(key)
+  if future is None:
+    future = loop.run_in_executor(_get_executor(), func, *args)
+    _in_flight[key] = future
+    future.add_done_callback(lambda done: _in_flight.pop(key, None))
+  else:
+    module_logger.debug("run_blocking: joining %s%s", func.__name__, args)
+  return await asyncio.shield(future)
+
+async def get_calibrator_flux_async(source, freq, date):
+  """
+  Asyncio version of radio_flux.get_calibrator_flux
+
+  @return: flux in Jy and origin of flux data
+  """
+  from Radio_Astronomy.radio_flux import get_calibrator_flux
+  return await run_blocking(get_calibrator_flux, source, freq, date)
+
+async def get_cal_data_async(source):
+  """
+  Asyncio version of vla_cal.get_cal_data
+
+  The returned dictionary may be shared with other callers who asked for
+  the same source at the same time, so it should not be modified.
+
+  @return: dictionary
+  """
+  from Radio_Astronomy.vla_cal import get_cal_data
+  return await run_blocking(get_cal_data, source)
+
+async def polate_flux_async(Bname, datenum, freq):
+  """
+  Asyncio version of michigan.polate_flux
+
+  @return: flux in Jy
+  """
+  from Radio_Astronomy.michigan import polate_flux
+  return await run_blocking(polate_flux, Bname, datenum, freq)
+
+async def gather_calibrator_fluxes(sources, freq, date,
+                                   return_exceptions=False):
+  """
+  Fluxes of many calibrators at one frequency and date
+
+  @param sources : calibrator names
+  @type  sources : list of str
+
+  @param freq : frequency in GHz
+  @type  freq : float
+
+  @param date : date for flux estimate
+  @type  date : datetime.datetime() instance
+
+  @param return_exceptions : passed to asyncio.gather
+  @type  return_exceptions : bool
+
+  @return: list of (flux, origin) in the order of sources
+  """
+  return await asyncio.gather(*[get_calibrator_flux_async(source, freq, date)
+                                for source in sources],
+                              return_exceptions=return_exceptions)
@@ -8,17 +8,27 @@ Examples::
  Out[2]: 'S'
  In [3]: band_to_frequency('K')
  Out[3]: 22
+ In [4]: frequencies_to_bands([3, 22, 0.5])
+ Out[4]: array(['S', 'K', ''], dtype='<U2')
 """
+import numpy
+
+# lower band edges in GHz and the band codes used by frequency_to_band
+band_edges = numpy.array([1, 2, 4, 8, 12, 18, 26.5, 40, 50, 75, 115])
+band_codes = numpy.array(["", "L", "S", "C", "X", "Ku", "K", "Ka", "Q", "V",
+                          "W", "D"])
+
 def frequency_to_band(freq):
   """
   band code from frequency in GHz
   """
-  if                  freq  <  1:   return None
+  if not numpy.isfinite(freq):      return None
+  elif                freq  <  1:   return None
   elif freq >= 1   and freq <  2:   return "L"
   elif freq >= 2   and freq <  4:   return "S"
   elif freq >= 4   and freq <  8:   return "C"
   elif freq >= 8   and freq < 12:   return "X"
-  elif freq >=12   and freq < 18:   return "Ka"
+  elif freq >=12   and freq < 18:   return "Ku"
   elif freq >=18   and freq < 26.5: return "K"
   elif freq >=26.5 and freq < 40:   return "Ka"
   elif freq >=40   and freq < 50:   return "Q"
@@ -40,3 +50,14 @@ def band_to_frequency(band):
   elif band == "Q":  return 42
   elif band == "W":  return 90
   else: return None
+
+def frequencies_to_bands(freqs):
+  """
+  band codes for an array of frequencies in GHz
+
+  This is the array version of ``frequency_to_band``.  Frequencies below
+  1 GHz, NaN and infinite ones get ''.
+  """
+  freqs = numpy.asarray(freqs, dtype=float)
+  codes = band_codes[numpy.searchsorted(band_edges, freqs, side='right')]
+  return numpy.where(numpy.isfinite(freqs), codes, '')
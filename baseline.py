@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Module baseline removes standing-wave ripples from spectra.
+
+Reflections between two surfaces a distance L apart, e.g. a feed and the
+subreflector, make a ripple across the band with the period given by
+``standing_wave_spectrum(L, dielectric_constant)``.  With the period known
+the ripple is linear in its unknowns::
+
+  ripple(f) = sum_h a_h cos(2 pi h f/P) + b_h sin(2 pi h f/P)
+
+It is fitted together with a low-order polynomial, so that a sloping
+baseline does not leak into it.  Every spectrum has the same design matrix,
+so its pseudo-inverse is computed once and all the spectra are fitted with
+one matrix product per block of spectra::
+
+ In [1]: from Radio_Astronomy.baseline import remove_standing_wave
+ In [2]: freqs = 22e9 + numpy.arange(4096)*25e3       # Hz
+ In [3]: coefs = remove_standing_wave(cube, freqs, 3.6)
+"""
+import logging
+import math
+
+import numpy
+
+from Radio_Astronomy import standing_wave_spectrum
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+def ripple_design_matrix(freqs, period, n_harmonics=1, poly_degree=1):
+  """
+  Columns of the ripple and baseline model at each frequency
+
+  The first 2*n_harmonics columns are the cosine and sine of each harmonic;
+  the rest are powers of the frequency offset from the band centre, scaled
+  to -1 to 1.
+
+  @param freqs : channel frequencies (Hz)
+  @type  freqs : array of float
+
+  @param period : ripple period (Hz)
+  @type  period : float
+
+  @param n_harmonics : number of harmonics of the ripple
+  @type  n_harmonics : int
+
+  @param poly_degree : degree of the baseline polynomial; -1 for none
+  @type  poly_degree : int
+
+  @return: numpy array, shape (channels, 2*n_harmonics + poly_degree + 1)
+  """
+  freqs = numpy.asarray(freqs, dtype=float)
+  phase = (2*math.pi/period)*freqs
+  columns = []
+  for harmonic in range(1, n_harmonics + 1):
+    columns.append(numpy.cos(harmonic*phase))
+    columns.append(numpy.sin(harmonic*phase))
+  centre = 0.5*(freqs.max() + freqs.min())
+  half_width = 0.5*(freqs.max() - freqs.min()) or 1.
+  x = (freqs - centre)/half_width
+  for degree in range(poly_degree + 1):
+    columns.append(x**degree)
+  return numpy.column_stack(columns)
+
+@instrumented
+def remove_standing_wave(spectra, freqs, length, dielectric_constant=1.,
+                         n_harmonics=1, poly_degree=1, channel_mask=None,
+                         remove_baseline=False, block_size=1024):
+  """
+  Fit and subtract the standing-wave ripple of many spectra, in place
+
+  The channels are the last axis of ``spectra``; any other axes (time,
+  beam, polarization, ...) are treated as separate spectra.  The array is
+  modified in place, a block of spectra at a time, so the only temporary
+  arrays are the size of one block.
+
+  @param spectra : spectra, last axis channels; must be a float array
+  @type  spectra : numpy array
+
+  @param freqs : channel frequencies (Hz)
+  @type  freqs : array of float
+
+  @param length : distance between the reflecting surfaces (m)
+  @type  length : float
+
+  @param dielectric_constant : one in free space
+  @type  dielectric_constant : float
+
+  @param n_harmonics : number of harmonics of the ripple to fit
+  @type  n_harmonics : int
+
+  @param poly_degree : degree of the baseline polynomial fitted with the
+                       ripple; -1 for none
+  @type  poly_degree : int
+
+  @param channel_mask : True for the channels to use in the fit, e.g. to
+                        leave out spectral lines; default: all
+  @type  channel_mask : array of bool
+
+  @param remove_baseline : subtract the polynomial as well as the ripple
+  @type  remove_baseline : bool
+
+  @param block_size : number of spectra fitted at a time
+  @type  block_size : int
+
+  @return: fitted coefficients, cosine and sine for each harmonic and then
+           the polynomial terms, shape spectra.shape[:-1] + (terms,)
+  """
+  if not isinstance(spectra, numpy.ndarray) \
+     or not numpy.issubdtype(spectra.dtype, numpy.floating):
+    raise RuntimeError("spectra must be a numpy array of floats")
+  n_chans = spectra.shape[-1]
+  if len(freqs) != n_chans:
+    raise RuntimeError("need one frequency per channel")
+  period = standing_wave_spectrum(length, dielectric_constant)
+  A = ripple_design_matrix(freqs, period, n_harmonics, poly_degree)
+  if channel_mask is None:
+    pseudo_inverse = numpy.linalg.pinv(A)
+  else:
+    channel_mask = numpy.asarray(channel_mask, dtype=bool)
+    pseudo_inverse = numpy.zeros((A.shape[1], n_chans))
+    pseudo_inverse[:, channel_mask] = numpy.linalg.pinv(A[channel_mask])
+  n_removed = A.shape[1] if remove_baseline else 2*n_harmonics
+  removed = A[:, :n_removed].T.astype(spectra.dtype)
+  pseudo_inverse = pseudo_inverse.T.astype(spectra.dtype)
+  # reshape copies arrays whose spectra cannot be stacked without copying
+  flat = spectra.reshape(-1, n_chans)
+  if flat.size and not numpy.shares_memory(flat, spectra):
+    raise RuntimeError("spectra must be stored so that they can be fitted in"
+                       " place, e.g. contiguous")
+  coefficients = numpy.empty((flat.shape[0], A.shape[1]), dtype=spectra.dtype)
+  for start in range(0, flat.shape[0], block_size):
+    block = flat[start:start+block_size]
+    coefs = block @ pseudo_inverse
+    coefficients[start:start+block_size] = coefs
+    block -= coefs[:, :n_removed] @ removed
+  module_logger.debug("remove_standing_wave: %d spectra, period %.3f MHz",
+                      flat.shape[0], period/1e6)
+  return coefficients.reshape(spectra.shape[:-1] + (A.shape[1],))
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the Radio_Astronomy package.
+
+These are scripts, not tests, and are run as modules, e.g.::
+
+  python -m Radio_Astronomy.benchmarks.micro --save baseline.json
+  python -m Radio_Astronomy.benchmarks.micro --compare baseline.json
+
+The timing, saving and comparison helpers are in ``timing``.
+"""
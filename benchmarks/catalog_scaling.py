@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling of the vla_cal catalogue functions with catalogue size.
+
+Synthetic catalogues with the schema of ``VLA_cals`` (J name keys; 'ra',
+'dec', 'bname', optional 'cat3c' and 'mmNNN' fluxes) are written, with the
+``B_names`` and ``3C_names`` cross-references, to a temporary directory
+which ``vla_cal`` is pointed at.  For each size this reports
+
+  * the time and peak Python memory to load the catalogue (get_cal_dict)
+  * the time to build the name cross-references (VLA_name_xref)
+  * latency percentiles of get_cal_data and match_IAU_name look-ups
+
+Usage::
+
+  python -m Radio_Astronomy.benchmarks.catalog_scaling
+  python -m Radio_Astronomy.benchmarks.catalog_scaling --sizes 1000 100000 \\
+                                                       --save scaling.json
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+
+from Radio_Astronomy.benchmarks.timing import machine_info
+
+module_logger = logging.getLogger(__name__)
+
+bands = ['mm7', 'mm13', 'mm20', 'mm37', 'mm60', 'mm200', 'mm900']
+
+def _IAU_names(codes):
+  """
+  IAU style names 'HHMM+DDd' from integer codes
+
+  A code is minute of RA * 1801 + tenth of a degree of declination + 900
+  """
+  minutes, tenths = numpy.divmod(codes, 1801)
+  tenths = tenths - 900
+  signs = numpy.where(tenths < 0, '-', '+')
+  tenths = numpy.abs(tenths)
+  return ["%02d%02d%s%03d" % (m//60, m % 60, s, t)
+          for m, s, t in zip(minutes, signs, tenths)]
+
+def make_synthetic_catalog(n_sources, seed=0, fraction_3C=0.05):
+  """
+  Random calibrator catalogue in the VLA_cals schema
+
+  Names are unique.  Each source has between one and all of the bands.
+
+  @param n_sources : number of sources, at most 2 593 440
+  @type  n_sources : int
+
+  @param seed : random number generator seed
+  @type  seed : int
+
+  @param fraction_3C : fraction of sources with a 3C name
+  @type  fraction_3C : float
+
+  @return: dictionary of dictionaries
+  """
+  rng = numpy.random.default_rng(seed)
+  n_codes = 24*60*1801
+  codes = rng.choice(n_codes, size=n_sources, replace=False)
+  J_names = _IAU_names(codes)
+  # B1950 names: a different, still unique, set of codes
+  B_names = _IAU_names((codes + n_codes//3) % n_codes)
+  minutes, tenths = numpy.divmod(codes, 1801)
+  ra = (minutes + rng.uniform(0, 1, n_sources))/60.
+  dec = (tenths - 900 + rng.uniform(0, 1, n_sources))/10.
+  has_band = rng.uniform(0, 1, (n_sources, len(bands))) < 0.5
+  has_band[numpy.arange(n_sources), rng.integers(0, len(bands), n_sources)] \
+                                                                        = True
+  fluxes = numpy.round(rng.lognormal(0, 1, (n_sources, len(bands))), 2)
+  with_3C = numpy.flatnonzero(rng.uniform(0, 1, n_sources) < fraction_3C)
+  cat = {}
+  for index in range(n_sources):
+    source = {'ra': float(ra[index]), 'dec': float(dec[index]),
+              'bname': B_names[index]}
+    for band in numpy.flatnonzero(has_band[index]):
+      source[bands[band]] = float(fluxes[index, band])
+    cat[J_names[index]] = source
+  for number, index in enumerate(with_3C):
+    cat[J_names[index]]['cat3c'] = '3C'+str(number+1)
+  return cat
+
+def write_catalog_files(cat, directory, protocol=0):
+  """
+  Write VLA_cals, B_names and 3C_names as vla_cal expects them
+
+  Protocol 0 is what the files in the package use.
+  """
+  from Radio_Astronomy.vla_cal import VLA_name_xref
+  Bname_dict, cat_3C_dict = VLA_name_xref(cat)
+  for filename, data in [('VLA_cals', cat), ('B_names', Bname_dict),
+                         ('3C_names', cat_3C_dict)]:
+    with open(os.path.join(directory, filename), 'wb') as dbfile:
+      pickle.dump(data, dbfile, protocol=protocol)
+
+def percentiles(latencies):
+  """
+  50th, 90th and 99th percentile and maximum, in seconds
+  """
+  p50, p90, p99 = numpy.percentile(latencies, [50, 90, 99])
+  return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+          'max': float(numpy.max(latencies))}
+
+def measure(n_sources, n_lookups=20, protocol=0, seed=0):
+  """
+  Load, cross-reference and look-up figures for one catalogue size
+
+  @param n_sources : catalogue size
+  @type  n_sources : int
+
+  @param n_lookups : number of timed look-ups of each kind
+  @type  n_lookups : int
+
+  @return: dictionary of results
+  """
+  from Radio_Astronomy import vla_cal
+  cat = make_synthetic_catalog(n_sources, seed=seed)
+  directory = tempfile.mkdtemp(prefix='vla_cal_scaling_')
+  saved_cal_dir = vla_cal.cal_dir
+  try:
+    write_catalog_files(cat, directory, protocol=protocol)
+    file_size = os.path.getsize(os.path.join(directory, 'VLA_cals'))
+    vla_cal.cal_dir = directory + os.sep
+    tracemalloc.start()
+    start = time.perf_counter()
+    loaded = vla_cal.get_cal_dict()
+    load_time = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    vla_cal.VLA_name_xref(loaded)
+    xref_time = time.perf_counter() - start
+    rng = numpy.random.default_rng(seed+1)
+    names = list(loaded.keys())
+    picks = [names[i] for i in rng.integers(0, len(names), n_lookups)]
+    del loaded
+    get_latencies = []
+    for name in picks:
+      start = time.perf_counter()
+      vla_cal.get_cal_data('J'+name)
+      get_latencies.append(time.perf_counter() - start)
+    match_latencies = []
+    for name in picks:
+      # one character short, so the whole list is searched
+      start = time.perf_counter()
+      vla_cal.match_IAU_name(name[:-1], names)
+      match_latencies.append(time.perf_counter() - start)
+  finally:
+    vla_cal.cal_dir = saved_cal_dir
+    shutil.rmtree(directory, ignore_errors=True)
+  return {'n_sources': n_sources, 'file_bytes': file_size,
+          'load_s': load_time, 'load_peak_bytes': peak_memory,
+          'xref_s': xref_time,
+          'get_cal_data_s': percentiles(get_latencies),
+          'match_IAU_name_s': percentiles(match_latencies)}
+
+def report(results):
+  """
+  Print a table of results
+  """
+  print("%9s %9s %9s %9s %9s %21s %21s" % ("sources", "file MB", "load s",
+        "peak MB", "xref s", "get_cal_data p50/p99", "match_IAU p50/p99"))
+  for result in results:
+    print("%9d %9.1f %9.3f %9.1f %9.3f %10.4f/%-10.4f %10.4f/%-10.4f" % (
+          result['n_sources'], result['file_bytes']/1e6, result['load_s'],
+          result['load_peak_bytes']/1e6, result['xref_s'],
+          result['get_cal_data_s']['p50'], result['get_cal_data_s']['p99'],
+          result['match_IAU_name_s']['p50'],
+          result['match_IAU_name_s']['p99']))
+
+def main(argv=None):
+  """
+  Command line driver
+  """
+  import argparse
+  parser = argparse.ArgumentParser(
+                  description="vla_cal scaling with synthetic catalogues")
+  parser.add_argument('--sizes', type=int, nargs='+',
+                      default=[1000, 10000, 100000, 1000000],
+                      help='catalogue sizes')
+  parser.add_argument('--lookups', type=int, default=20,
+                      help='number of timed look-ups of each kind per size')
+  parser.add_argument('--protocol', type=int, default=0,
+                      help='pickle protocol for the catalogue files')
+  parser.add_argument('--save', metavar='FILE',
+                      help='write the results to this JSON file')
+  args = parser.parse_args(argv)
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+  results = []
+  for size in args.sizes:
+    module_logger.info("measuring %d sources", size)
+    results.append(measure(size, n_lookups=args.lookups,
+                           protocol=args.protocol))
+  report(results)
+  if args.save:
+    with open(args.save, 'w') as outfile:
+      json.dump({'meta': machine_info(), 'results': results}, outfile,
+                indent=1)
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of the public functions of Radio_Astronomy.
+
+All inputs are synthetic.  ``michigan.polate_flux`` normally fetches its
+data from the UMRAO web site; here ``michigan.get_flux_data`` is replaced
+by a local stand-in while that benchmark runs, so no network is needed.
+
+Groups whose modules cannot be imported (e.g. because ``ephem`` or the
+``Astronomy`` package is missing) are skipped with a message.
+
+Usage::
+
+  python -m Radio_Astronomy.benchmarks.micro --save baseline.json
+  python -m Radio_Astronomy.benchmarks.micro --compare baseline.json \\
+                                             --threshold 0.2
+"""
+import datetime
+import logging
+import sys
+
+import numpy
+
+import Radio_Astronomy as RA
+from Radio_Astronomy.benchmarks.timing import benchmark_main
+
+module_logger = logging.getLogger(__name__)
+
+# synthetic inputs
+rng = numpy.random.default_rng(1420)
+N = 10000
+freqs_GHz = numpy.linspace(1., 100., N)
+wavelengths = 0.3/freqs_GHz
+powers = rng.uniform(1e-9, 1e-3, N)
+levels = rng.uniform(-100., 0., N)
+date = datetime.datetime(2020, 1, 1, 12)
+
+def conversion_cases():
+  """
+  Functions in the package namespace, with scalar and array arguments
+  """
+  cases = {
+    'antenna_gain':            lambda: RA.antenna_gain(0.7, 907.9),
+    'antenna_solid_angle':     lambda: RA.antenna_solid_angle(0.7, 907.9,
+                                                              0.036),
+    'antenna_temp':            lambda: RA.antenna_temp(0.3, 2.),
+    'antenna_temperature':     lambda: RA.antenna_temperature(2., 635.5),
+    'beam_efficiency':         lambda: RA.beam_efficiency(2e-6, 1.5e-6),
+    'beam_solid_angle':        lambda: RA.beam_solid_angle(1e-3, 1e-3),
+    'dB':                      lambda: RA.dB(0.5),
+    'dB[array]':               lambda: RA.dB(powers),
+    'dBm':                     lambda: RA.dBm(1e-3),
+    'dBm[array]':              lambda: RA.dBm(powers),
+    'dbm_to_dbuv':             lambda: RA.dbm_to_dbuv(-30.),
+    'dbm_to_dbuv[array]':      lambda: RA.dbm_to_dbuv(levels),
+    'dbm_to_v':                lambda: RA.dbm_to_v(-30.),
+    'dBm_to_watts':            lambda: RA.dBm_to_watts(-30.),
+    'dBm_to_watts[array]':     lambda: RA.dBm_to_watts(levels),
+    'dbuv_to_dbm':             lambda: RA.dbuv_to_dbm(60.),
+    'dbuv_to_dmw_per_sq_m':    lambda: RA.dbuv_to_dmw_per_sq_m(60.),
+    'dbuv_to_uV':              lambda: RA.dbuv_to_uV(60.),
+    'dbuv_to_v':               lambda: RA.dbuv_to_v(60.),
+    'dmw_per_sq_m_to_dbuv':    lambda: RA.dmw_per_sq_m_to_dbuv(-50.),
+    'directivity':             lambda: RA.directivity(0.7, 907.9, 0.036),
+    'forward_gain':            lambda: RA.forward_gain(0.7, 907.9, 0.036),
+    'flux':                    lambda: RA.flux(500., 8.4, 1e-4),
+    'freq_to_chan':            lambda: RA.freq_to_chan(10., 500., 16384),
+    'freqs_to_chans[array]':   lambda: RA.freqs_to_chans(freqs_GHz, 100.,
+                                                         16384),
+    'gain':                    lambda: RA.gain(3.),
+    'HPBW':                    lambda: RA.HPBW(12., 0.036, 34.),
+    'noise_figure':            lambda: RA.noise_figure(40.),
+    'noise_power':             lambda: RA.noise_power(40., 1e8),
+    'rms_noise':               lambda: RA.rms_noise(40., 1e8, 10.),
+    'ruze_loss_factor':        lambda: RA.ruze_loss_factor(2.5e-4, 0.036),
+    'SNR':                     lambda: RA.SNR(0.1, 40., 1e8, 10.),
+    'v_to_dbuv':               lambda: RA.v_to_dbuv(1e-3),
+    'volts_to_watts':          lambda: RA.volts_to_watts(1e-3),
+    'v_to_dbm':                lambda: RA.v_to_dbm(1e-3),
+    'watts_to_volts':          lambda: RA.watts_to_volts(1e-3),
+    'watts_to_volts[array]':   lambda: RA.watts_to_volts(powers),
+    'delta_f':                 lambda: RA.delta_f(1e3, 22.235e9),
+    'sky_frequency[array]':    lambda: RA.sky_frequency(powers*1e9,
+                                                        22.235e9),
+    'standing_wave_spectrum':  lambda: RA.standing_wave_spectrum(3.6, 1.),
+    'angular_separation[array]': lambda: RA.angular_separation(
+                                         0., 0., powers*1e3, levels/100),
+  }
+  dipole = RA.Dipole(0.5, 1e-3)
+  cases['Dipole.impedance[array]'] = \
+                          lambda: dipole.impedance(wavelengths/100., 376.73)
+  # 1e7 points: 1000 theta x 100 phi x 100 wavelengths
+  theta = numpy.linspace(0., numpy.pi, 1000)[:,None,None]
+  phi = numpy.linspace(0., 2*numpy.pi, 100)[None,:,None]
+  wvlns = numpy.linspace(0.9, 1.1, 100)[None,None,:]
+  cases['Dipole.pattern[1e7]'] = lambda: dipole.pattern(theta, wvlns, phi)
+  cases['Dipole.directivity[1e7]'] = \
+                          lambda: dipole.directivity(theta, wvlns, phi=phi)
+  cases['Dipole.effective_area[1e7]'] = \
+                          lambda: dipole.effective_area(theta, wvlns, phi=phi)
+  # 300 elements over 50 wavelengths
+  array = RA.DipoleArray(RA.Dipole(0.5, 1e-4), numpy.arange(300)*0.5)
+  sweep = numpy.linspace(0.9, 1.1, 50)
+  cases['DipoleArray.impedance_matrix[300x50]'] = \
+                          lambda: array.impedance_matrix(sweep)
+  cases['DipoleArray.active_impedance[300x50]'] = \
+                          lambda: array.active_impedance(sweep)
+  return cases
+
+def radio_flux_cases():
+  """
+  Planet and background models
+  """
+  from Radio_Astronomy import radio_flux
+  grid = freqs_GHz*1e3
+  def cold_galactic_BG():
+    with radio_flux._BG_lock:
+      radio_flux._BG_cache.clear()
+    return radio_flux.galactic_BG(grid)
+  return {
+    'radio_flux.planet_brightness':
+                       lambda: radio_flux.planet_brightness('Venus', 8.4),
+    'radio_flux.planet_brightness[array]':
+                       lambda: radio_flux.planet_brightness('Venus', freqs_GHz),
+    'radio_flux.get_planet_flux':
+                       lambda: radio_flux.get_planet_flux('Jupiter', 8.4, date),
+    'radio_flux.galactic_BG':
+                       lambda: radio_flux.galactic_BG(40.),
+    'radio_flux.galactic_BG[array, cold cache]':   cold_galactic_BG,
+    'radio_flux.galactic_BG[array, warm cache]':
+                       lambda: radio_flux.galactic_BG(grid),
+  }
+
+def vla_cal_cases():
+  """
+  Catalogue look-ups with the catalogue files in the package
+  """
+  from Radio_Astronomy import vla_cal
+  J_names = list(vla_cal.get_cal_dict().keys())
+  return {
+    'vla_cal.get_cal_dict':   vla_cal.get_cal_dict,
+    'vla_cal.get_cal_data':   lambda: vla_cal.get_cal_data('J1229+020'),
+    'vla_cal.match_IAU_name': lambda: vla_cal.match_IAU_name('1229+02',
+                                                             J_names),
+  }
+
+def sexagesimal_cases():
+  """
+  Bulk conversion of formatted coordinates like those of the VLA list
+  """
+  from Radio_Astronomy.sexagesimal import parse_angles, parse_coordinates
+  hours = numpy.linspace(0., 23.99, 10000)
+  ra = ["%02dh%02dm%09.6fs" % (int(h), int(h*60) % 60, (h*3600) % 60)
+        for h in hours]
+  pairs = ["%02d:%02d:%04.1f +%02d:%02d:%02d" % (int(h), int(h*60) % 60,
+                                                 (int(h*36000) % 600)/10.,
+                                                 int(h*3), int(h*60) % 60,
+                                                 int(h*3600) % 60)
+           for h in hours]
+  return {
+    'sexagesimal.parse_angles[10000]':      lambda: parse_angles(ra),
+    'sexagesimal.parse_coordinates[10000]': lambda: parse_coordinates(pairs),
+  }
+
+def stand_in_flux_data(url):
+  """
+  Synthetic replacement for michigan.get_flux_data
+
+  Three frequencies with monthly measurements over ten years
+  """
+  times, fluxes, sigflux = {}, {}, {}
+  dates = 733000. + 30.*numpy.arange(120)
+  for freq in ['4.8', '8.0', '14.5']:
+    times[freq] = list(dates)
+    fluxes[freq] = list(10. + numpy.sin(dates/300.) + float(freq)/10.)
+    sigflux[freq] = [0.1]*len(dates)
+  return times, fluxes, sigflux
+
+def michigan_cases():
+  """
+  Flux interpolation with local stand-in data
+  """
+  from Radio_Astronomy import michigan
+  Bname = michigan.Bnames[0]
+  def polate():
+    original = michigan.get_flux_data
+    michigan.get_flux_data = stand_in_flux_data
+    try:
+      return michigan.polate_flux(Bname, 733500., 22.)
+    finally:
+      michigan.get_flux_data = original
+  return {'michigan.polate_flux': polate}
+
+case_groups = [conversion_cases, radio_flux_cases, vla_cal_cases,
+               sexagesimal_cases, michigan_cases]
+
+def make_cases():
+  """
+  All the benchmark cases whose modules can be imported
+  """
+  cases = {}
+  for group in case_groups:
+    try:
+      cases.update(group())
+    except ImportError as details:
+      module_logger.warning("skipping %s: %s", group.__name__, details)
+  return cases
+
+if __name__ == "__main__":
+  sys.exit(benchmark_main(__doc__.split('\n')[1], make_cases))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Timing helpers shared by the benchmark scripts.
+
+Results are dictionaries keyed by benchmark name.  Each value has the best
+and median time per call in seconds and the number of calls per timing
+loop.  Results are saved to JSON together with a description of the
+machine so that baselines from different hosts are not confused.
+"""
+import datetime
+import json
+import logging
+import platform
+import sys
+import timeit
+
+import numpy
+
+module_logger = logging.getLogger(__name__)
+
+def time_call(func, repeat=5, min_time=0.2):
+  """
+  Time a function which takes no arguments
+
+  The number of calls per loop is chosen so that a loop takes at least
+  ``min_time`` seconds, and the loop is repeated ``repeat`` times.
+
+  @param func : function to time
+  @type  func : callable
+
+  @param repeat : number of timing loops
+  @type  repeat : int
+
+  @param min_time : smallest duration of a timing loop in sec
+  @type  min_time : float
+
+  @return: dictionary with 'best' and 'median' time per call and 'loops'
+  """
+  timer = timeit.Timer(func)
+  loops = 1
+  while True:
+    duration = timer.timeit(loops)
+    if duration >= min_time or loops >= 1e7:
+      break
+    loops *= 10 if duration < min_time/10 else 2
+  times = numpy.array(timer.repeat(repeat=repeat, number=loops))/loops
+  return {'best': float(times.min()), 'median': float(numpy.median(times)),
+          'loops': loops}
+
+def run_benchmarks(cases, only=None, repeat=5, min_time=0.2):
+  """
+  Time a collection of benchmark cases
+
+  @param cases : benchmark functions keyed by name
+  @type  cases : dict
+
+  @param only : if given, run only cases whose name contains this
+  @type  only : str
+
+  @return: results keyed by name
+  """
+  results = {}
+  for name in sorted(cases):
+    if only and only not in name:
+      continue
+    try:
+      results[name] = time_call(cases[name], repeat=repeat, min_time=min_time)
+    except Exception as details:
+      module_logger.error("%s failed: %s", name, details)
+      continue
+    module_logger.info("%-45s %12.3f us", name, results[name]['best']*1e6)
+  return results
+
+def machine_info():
+  """
+  Description of the host and software versions
+  """
+  return {'python': sys.version.split()[0],
+          'numpy': numpy.__version__,
+          'platform': platform.platform(),
+          'machine': platform.machine(),
+          'date': datetime.datetime.now().isoformat()}
+
+def save_results(results, filename):
+  """
+  Write results and machine information to a JSON file
+  """
+  with open(filename, 'w') as outfile:
+    json.dump({'meta': machine_info(), 'results': results}, outfile,
+              indent=1, sort_keys=True)
+
+def load_results(filename):
+  """
+  Read results written by ``save_results``
+  """
+  with open(filename, 'r') as infile:
+    return json.load(infile)['results']
+
+def compare_results(results, baseline, threshold=0.25):
+  """
+  Find benchmarks which became slower than a baseline
+
+  The best times are compared.  A benchmark regressed if it is slower by
+  more than the fraction ``threshold``.
+
+  @param results : new results
+  @type  results : dict
+
+  @param baseline : reference results
+  @type  baseline : dict
+
+  @param threshold : allowed fractional slow-down
+  @type  threshold : float
+
+  @return: regressions as {name: new time / baseline time}
+  """
+  regressions = {}
+  for name in sorted(results):
+    if name not in baseline:
+      continue
+    ratio = results[name]['best']/baseline[name]['best']
+    if ratio > 1 + threshold:
+      regressions[name] = ratio
+      module_logger.warning("%-45s %6.2f times slower", name, ratio)
+    else:
+      module_logger.debug("%-45s %6.2f", name, ratio)
+  return regressions
+
+def benchmark_main(description, make_cases, argv=None):
+  """
+  Command line driver shared by the benchmark scripts
+
+  @param description : help text for the command
+  @type  description : str
+
+  @param make_cases : returns the benchmark functions keyed by name
+  @type  make_cases : callable
+
+  @return: process exit status, 1 if a regression was found
+  """
+  import argparse
+  parser = argparse.ArgumentParser(description=description)
+  parser.add_argument('--save', metavar='FILE',
+                      help='write the results to this JSON file')
+  parser.add_argument('--compare', metavar='FILE',
+                      help='compare with the results in this JSON file')
+  parser.add_argument('--threshold', type=float, default=0.25,
+                      help='fractional slow-down counted as a regression')
+  parser.add_argument('--only', metavar='TEXT',
+                      help='run only benchmarks with TEXT in their name')
+  parser.add_argument('--repeat', type=int, default=5,
+                      help='number of timing loops per benchmark')
+  args = parser.parse_args(argv)
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+  results = run_benchmarks(make_cases(), only=args.only, repeat=args.repeat)
+  if args.save:
+    save_results(results, args.save)
+  if args.compare:
+    regressions = compare_results(results, load_results(args.compare),
+                                  threshold=args.threshold)
+    if regressions:
+      module_logger.warning("%d regressions", len(regressions))
+      return 1
+  return 0
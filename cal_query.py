@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Module cal_query selects calibrators from the VLA calibrator catalogue with
+conditions which are evaluated as array operations over its columns.
+
+Conditions are Predicate objects which can be combined with ``&`` (and),
+``|`` (or) and ``~`` (not)::
+
+ In [1]: from Radio_Astronomy.cal_query import *
+ In [2]: cat = get_catalog()
+ In [3]: p = dec_between(-10, 40) & ra_window(22, 2) & flux_above(22., 1.)
+ In [4]: cat.names(p)
+ Out[4]: array(['0006-063', '0050-094', ...])
+ In [5]: cat.names(p & ~has_3c())
+
+Evaluating a predicate costs a few comparisons over arrays of the size of
+the catalogue.  Fluxes interpolated to a frequency are computed once per
+frequency and kept with the catalogue, so a query can be repeated with
+other limits thousands of times interactively.
+"""
+import logging
+from collections import OrderedDict
+from math import pi
+
+import numpy
+
+from Radio_Astronomy import angular_separation
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+from Radio_Astronomy.vla_cal import get_cal_columns, interpolate_flux_matrix
+
+module_logger = logging.getLogger(__name__)
+
+flux_cache_size = 32
+
+_catalog = None
+
+class Predicate(object):
+  """
+  Condition on calibrators which gives a boolean mask over a catalogue
+
+  Public attributes::
+    description - text describing the condition
+  """
+  def __init__(self, function, description):
+    """
+    @param function : returns a boolean array given a CalibratorCatalog
+    @type  function : callable
+
+    @param description : text describing the condition
+    @type  description : str
+    """
+    self._function = function
+    self.description = description
+
+  def __call__(self, catalog):
+    """
+    Mask of the sources in a catalogue which meet the condition
+
+    @param catalog : the catalogue
+    @type  catalog : CalibratorCatalog instance
+
+    @return: boolean numpy array with one element per source
+    """
+    return self._function(catalog)
+
+  def __and__(self, other):
+    return Predicate(lambda catalog: self(catalog) & other(catalog),
+                     "(%s and %s)" % (self.description, other.description))
+
+  def __or__(self, other):
+    return Predicate(lambda catalog: self(catalog) | other(catalog),
+                     "(%s or %s)" % (self.description, other.description))
+
+  def __invert__(self):
+    return Predicate(lambda catalog: ~self(catalog),
+                     "not %s" % self.description)
+
+  def __repr__(self):
+    return "Predicate(%s)" % self.description
+
+class CalibratorCatalog(object):
+  """
+  Columns of the calibrator catalogue with interpolated fluxes kept for
+  re-use
+
+  Public attributes::
+    columns - numpy arrays as returned by vla_cal.get_cal_columns()
+  """
+  def __init__(self, columns=None):
+    """
+    @param columns : catalogue columns; default: get_cal_columns()
+    @type  columns : dictionary of numpy arrays
+    """
+    if columns is None:
+      columns = get_cal_columns()
+    self.columns = columns
+    self._fluxes = OrderedDict()
+
+  def __len__(self):
+    return len(self.columns['jname'])
+
+  def flux_at(self, freq):
+    """
+    Flux of every source at a frequency, NaN where it is not known
+
+    The most recent ``flux_cache_size`` frequencies are remembered.
+
+    @param freq : frequency in GHz
+    @type  freq : float
+
+    @return: read-only numpy array of fluxes in Jy
+    """
+    freq = float(freq)
+    try:
+      S = self._fluxes[freq]
+    except KeyError:
+      record_cache('Radio_Astronomy.cal_query.CalibratorCatalog.flux_at',
+                   False)
+      S = interpolate_flux_matrix(self.columns['freqs'], self.columns['flux'],
+                                  freq)
+      S.flags.writeable = False
+      self._fluxes[freq] = S
+      while len(self._fluxes) > flux_cache_size:
+        self._fluxes.popitem(last=False)
+    else:
+      record_cache('Radio_Astronomy.cal_query.CalibratorCatalog.flux_at', True)
+      self._fluxes.move_to_end(freq)
+    return S
+
+  @instrumented
+  def mask(self, predicate):
+    """
+    Boolean mask of the sources which meet a condition
+
+    @param predicate : the condition
+    @type  predicate : Predicate instance
+
+    @return: boolean numpy array
+    """
+    return numpy.asarray(predicate(self), dtype=bool)
+
+  def names(self, predicate):
+    """
+    J names of the sources which meet a condition
+
+    @return: numpy array of str
+    """
+    return self.columns['jname'][self.mask(predicate)]
+
+  def subset(self, predicate):
+    """
+    Columns of the sources which meet a condition
+
+    @return: dictionary of numpy arrays like the 'columns' attribute
+    """
+    rows = self.mask(predicate)
+    result = {}
+    for key, column in self.columns.items():
+      result[key] = column if key == 'freqs' else column[rows]
+    return result
+
+  def records(self, predicate):
+    """
+    Catalogue entries of the sources which meet a condition
+
+    Each entry is a dictionary with the keys 'jname', 'ra', 'dec' and, if
+    the source has them, 'bname' and 'cat3c'.
+
+    @return: list of dictionaries
+    """
+    columns = self.subset(predicate)
+    records = []
+    for row in range(len(columns['jname'])):
+      record = {'jname': str(columns['jname'][row]),
+                'ra': float(columns['ra'][row]),
+                'dec': float(columns['dec'][row])}
+      for key in ['bname', 'cat3c']:
+        if columns[key][row]:
+          record[key] = str(columns[key][row])
+      records.append(record)
+    return records
+
+def get_catalog(reload=False):
+  """
+  The calibrator catalogue, read once and kept
+
+  @param reload : read the catalogue again
+  @type  reload : bool
+
+  @return: CalibratorCatalog instance
+  """
+  global _catalog
+  if _catalog is None or reload:
+    record_cache('Radio_Astronomy.cal_query.get_catalog', False)
+    _catalog = CalibratorCatalog()
+  else:
+    record_cache('Radio_Astronomy.cal_query.get_catalog', True)
+  return _catalog
+
+def dec_between(low, high):
+  """
+  Declination from low to high degrees, inclusive
+  """
+  return Predicate(lambda catalog: (catalog.columns['dec'] >= low)
+                                   & (catalog.columns['dec'] <= high),
+                   "%s <= dec <= %s" % (low, high))
+
+def ra_window(start, stop):
+  """
+  Right ascension from start to stop hours, inclusive
+
+  If start is greater than stop the window goes through 0h, e.g. 22 to 2.
+  """
+  start, stop = start % 24., stop % 24.
+  def function(catalog):
+    ra = catalog.columns['ra']
+    if start <= stop:
+      return (ra >= start) & (ra <= stop)
+    return (ra >= start) | (ra <= stop)
+  return Predicate(function, "%s <= ra <= %s" % (start, stop))
+
+def within(ra, dec, radius):
+  """
+  Within radius degrees of a direction given by ra in hours and dec in
+  degrees
+  """
+  def function(catalog):
+    separation = angular_separation(ra*pi/12, dec*pi/180,
+                                    catalog.columns['ra']*pi/12,
+                                    catalog.columns['dec']*pi/180)
+    return separation <= radius*pi/180
+  return Predicate(function, "within %s deg of (%s, %s)" % (radius, ra, dec))
+
+def has_3c():
+  """
+  Has a 3C name
+  """
+  return Predicate(lambda catalog: catalog.columns['cat3c'] != '', "has 3C")
+
+def has_bname():
+  """
+  Has a B1950 name
+  """
+  return Predicate(lambda catalog: catalog.columns['bname'] != '', "has B")
+
+def flux_above(freq, threshold):
+  """
+  Flux at freq GHz, interpolated from the catalogue bands, of at least
+  threshold Jy; false where the flux is not known
+  """
+  return Predicate(lambda catalog: catalog.flux_at(freq) >= threshold,
+                   "S(%s GHz) >= %s" % (freq, threshold))
+
+def flux_below(freq, threshold):
+  """
+  Flux at freq GHz, interpolated from the catalogue bands, of less than
+  threshold Jy; false where the flux is not known
+  """
+  return Predicate(lambda catalog: catalog.flux_at(freq) < threshold,
+                   "S(%s GHz) < %s" % (freq, threshold))
+
+def name_in(names):
+  """
+  J name (without the 'J') is one of a list
+  """
+  names = numpy.asarray(list(names), dtype=str)
+  return Predicate(lambda catalog: numpy.isin(catalog.columns['jname'], names),
+                   "name in list of %d" % len(names))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Module cal_select chooses calibrators from the VLA calibrator catalogue for
+lists of science targets.
+
+A good calibrator is close to the target and bright enough at the observing
+frequency to give a useful signal-to-noise ratio with the antenna and
+receiver in use.  All the targets are handled together with array
+operations, so thousands of targets can be done in one call::
+
+ In [1]: from math import pi
+ In [2]: from Radio_Astronomy.cal_select import select_calibrators
+ In [3]: names, sep, snr = select_calibrators(ra, dec, 22., 0.7*pi*17**2,
+                                              40., 1e8, 10.)
+
+``ra`` and ``dec`` are arrays of target J2000 coordinates in radians.  Row
+``i`` of the results gives the best calibrators for target ``i``, best
+first.
+"""
+import logging
+from math import pi
+
+import numpy
+
+from Radio_Astronomy import angular_separation, antenna_temperature, SNR
+from Radio_Astronomy.instrumentation import instrumented
+from Radio_Astronomy.vla_cal import get_cal_columns, interpolate_flux_matrix
+
+module_logger = logging.getLogger(__name__)
+
+@instrumented
+def calibrator_SNR(freq, effective_area, Tsys, bandwidth, integration_time,
+                   columns=None):
+  """
+  Predicted signal-to-noise ratio for every calibrator in the catalogue
+
+  @param freq : observing frequency in GHz
+  @type  freq : float
+
+  @param effective_area : antenna effective area in m^2
+  @type  effective_area : float
+
+  @param Tsys : system temperature (K)
+  @type  Tsys : float
+
+  @param bandwidth : system bandwidth in Hz
+  @type  bandwidth : float
+
+  @param integration_time : integration time in sec
+  @type  integration_time : float
+
+  @param columns : calibrator catalogue; default: get_cal_columns()
+  @type  columns : dictionary of numpy arrays
+
+  @return: array of SNR, NaN for sources without fluxes
+  """
+  if columns is None:
+    columns = get_cal_columns()
+  S = interpolate_flux_matrix(columns['freqs'], columns['flux'], freq)
+  Ta = antenna_temperature(S, effective_area)
+  return SNR(Ta, Tsys, bandwidth, integration_time)
+
+@instrumented
+def select_calibrators(ra, dec, freq, effective_area, Tsys, bandwidth,
+                       integration_time, n_best=3, max_separation=15*pi/180,
+                       min_SNR=10., SNR_weight=0.5, columns=None,
+                       chunk_size=1024):
+  """
+  Best calibrators for each of a list of targets
+
+  Calibrators further than ``max_separation`` from a target or with a
+  predicted SNR below ``min_SNR`` are not considered.  The others are
+  ranked by::
+
+    separation/max_separation - SNR_weight*log10(SNR/min_SNR)
+
+  lowest first, so that with the default weight a calibrator ten times
+  above the SNR limit can be half the maximum separation further away.
+  With ``SNR_weight = 0`` the nearest acceptable calibrator is chosen.  With
+  ``min_SNR <= 0`` only calibrators with a negative or unknown SNR are left
+  out, and the ranking uses log10(SNR).
+
+  Targets are processed ``chunk_size`` at a time to limit the size of the
+  target by calibrator separation matrix.
+
+  @param ra : target right ascensions (rad)
+  @type  ra : (numpy array of) float
+
+  @param dec : target declinations (rad)
+  @type  dec : (numpy array of) float
+
+  @param freq : observing frequency in GHz
+  @type  freq : float
+
+  @param effective_area : antenna effective area in m^2
+  @type  effective_area : float
+
+  @param Tsys : system temperature (K)
+  @type  Tsys : float
+
+  @param bandwidth : system bandwidth in Hz
+  @type  bandwidth : float
+
+  @param integration_time : integration time in sec
+  @type  integration_time : float
+
+  @param n_best : number of calibrators to return per target
+  @type  n_best : int
+
+  @param max_separation : largest acceptable separation (rad)
+  @type  max_separation : float
+
+  @param min_SNR : smallest acceptable SNR
+  @type  min_SNR : float
+
+  @param SNR_weight : importance of SNR relative to separation
+  @type  SNR_weight : float
+
+  @param columns : calibrator catalogue; default: get_cal_columns()
+  @type  columns : dictionary of numpy arrays
+
+  @param chunk_size : number of targets processed together
+  @type  chunk_size : int
+
+  @return: (J names, separations in rad, SNRs), each of shape
+           (number of targets, n_best); unused places are '' or NaN
+  """
+  if columns is None:
+    columns = get_cal_columns()
+  ra = numpy.atleast_1d(numpy.asarray(ra, dtype=float))
+  dec = numpy.atleast_1d(numpy.asarray(dec, dtype=float))
+  n_targets = len(ra)
+  snr = calibrator_SNR(freq, effective_area, Tsys, bandwidth,
+                       integration_time, columns=columns)
+  # only calibrators bright enough need to be compared with the targets
+  usable = numpy.flatnonzero(snr >= min_SNR)
+  module_logger.debug("select_calibrators: %d of %d calibrators usable",
+                      len(usable), len(snr))
+  names = numpy.full((n_targets, n_best), '', dtype=columns['jname'].dtype)
+  separations = numpy.full((n_targets, n_best), numpy.nan)
+  SNRs = numpy.full((n_targets, n_best), numpy.nan)
+  if len(usable) == 0 or n_best < 1:
+    return names, separations, SNRs
+  cal_ra = columns['ra'][usable]*pi/12
+  cal_dec = columns['dec'][usable]*pi/180
+  cal_names = columns['jname'][usable]
+  snr = snr[usable]
+  # the reference SNR shifts all the scores of a target equally, so any
+  # positive value ranks the same; zero SNRs are floored to rank last
+  reference = min_SNR if min_SNR > 0 else 1.
+  SNR_term = SNR_weight*numpy.log10(numpy.maximum(snr, numpy.finfo(float).tiny)
+                                    /reference)
+  n_keep = min(n_best, len(usable))
+  for start in range(0, n_targets, chunk_size):
+    stop = min(start+chunk_size, n_targets)
+    sep = angular_separation(ra[start:stop,numpy.newaxis],
+                             dec[start:stop,numpy.newaxis], cal_ra, cal_dec)
+    score = sep/max_separation - SNR_term
+    score[sep > max_separation] = numpy.inf
+    if n_keep < len(usable):
+      best = numpy.argpartition(score, n_keep-1, axis=1)[:,:n_keep]
+    else:
+      best = numpy.broadcast_to(numpy.arange(n_keep), (stop-start, n_keep))
+    best_score = numpy.take_along_axis(score, best, axis=1)
+    order = numpy.argsort(best_score, axis=1)
+    best = numpy.take_along_axis(best, order, axis=1)
+    found = numpy.isfinite(numpy.take_along_axis(best_score, order, axis=1))
+    rows = slice(start, stop)
+    names[rows,:n_keep] = numpy.where(found, cal_names[best], '')
+    separations[rows,:n_keep] = numpy.where(found,
+                                  numpy.take_along_axis(sep, best, axis=1),
+                                  numpy.nan)
+    SNRs[rows,:n_keep] = numpy.where(found, snr[best], numpy.nan)
+  return names, separations, SNRs
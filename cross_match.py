@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Module cross_match joins the VLA calibrator list, its B1950 and 3C
+cross-references and the Michigan (UMRAO) table links into one table.
+
+The catalogues name sources differently: ``VLA_cals`` is keyed by J names
+without the 'J' and gives 3C names like '3C273', while
+``michigan.table_links`` is keyed by B names and gives 3C names like
+'3C 273'.  The join table has one row per source with all its names, and
+an index from every normalized name to the row, so a look-up in any of the
+naming schemes is a single dictionary access::
+
+ In [1]: from Radio_Astronomy.cross_match import lookup
+ In [2]: row = lookup('3c 273')
+ In [3]: row['jname'], row['bname'], row['michigan_url']
+ Out[3]: ('1229+020', '1226+023', 'http://www.astro.lsa.umich.edu/...')
+
+The table is built in one pass over the catalogues and saved in
+``cross_match_file``; it is rebuilt when either catalogue file is newer.
+"""
+import logging
+import os
+import pickle
+
+from Radio_Astronomy import cal_dir
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+
+module_logger = logging.getLogger(__name__)
+
+cross_match_file = os.path.join(cal_dir, "cross_match.pkl")
+source_files = [os.path.join(cal_dir, "VLA_cals"),
+                os.path.join(cal_dir, "michigan_tables.pkl")]
+
+_table = None
+
+def normalize_name(name):
+  """
+  Form of a source name used as a key in the join table
+
+  Spaces are removed and letters are capitalized, so '3c 273', '3C273' and
+  ' 3C 273' are the same.
+
+  @param name : source name
+  @type  name : str
+
+  @return: str
+  """
+  return "".join(name.split()).upper()
+
+def _new_row():
+  return {'jname': '', 'bname': '', 'cat3c': '', 'michigan_url': '',
+          'vla': None}
+
+@instrumented
+def build_table(cal_data=None, table_links=None):
+  """
+  Join the VLA and Michigan catalogues
+
+  Each row is a dictionary with the keys 'jname' and 'bname' (without the
+  prefix letter), 'cat3c' (like '3C273'), 'michigan_url' and 'vla' (the
+  VLA_cals entry).  Missing names are '' and a missing VLA entry is None.
+
+  The index has, for each row, the normalized J name with and without the
+  'J', the B name with and without the 'B' and the 3C name.  An unprefixed
+  name which is both a J and a B name is taken to be the J name.
+
+  @param cal_data : VLA calibrator data; default: vla_cal.get_cal_dict()
+  @type  cal_data : dictionary of dictionaries
+
+  @param table_links : Michigan tables keyed by B name; default: read from
+                       michigan_tables.pkl
+  @type  table_links : dictionary of (3C name, URL)
+
+  @return: (list of rows, dictionary of row numbers keyed by name)
+  """
+  if cal_data is None:
+    from Radio_Astronomy.vla_cal import get_cal_dict
+    cal_data = get_cal_dict()
+  if table_links is None:
+    with open(source_files[1], "rb") as tables:
+      table_links = pickle.load(tables)
+  rows = []
+  by_bname = {}
+  for jname in sorted(cal_data):
+    row = _new_row()
+    row['jname'] = jname
+    row['bname'] = cal_data[jname].get('bname', '') or ''
+    row['cat3c'] = normalize_name(cal_data[jname].get('cat3c', '') or '')
+    row['vla'] = cal_data[jname]
+    if row['bname']:
+      by_bname[row['bname']] = len(rows)
+    rows.append(row)
+  for bname in sorted(table_links):
+    cat3c, url = table_links[bname]
+    if bname in by_bname:
+      row = rows[by_bname[bname]]
+    else:
+      # a Michigan source which is not a VLA calibrator
+      row = _new_row()
+      row['bname'] = bname
+      by_bname[bname] = len(rows)
+      rows.append(row)
+    row['michigan_url'] = url
+    if cat3c and not row['cat3c']:
+      row['cat3c'] = normalize_name(cat3c)
+  index = {}
+  # unprefixed B names first so that unprefixed J names replace them
+  for number, row in enumerate(rows):
+    if row['bname']:
+      name = normalize_name(row['bname'])
+      index[name] = number
+      index['B'+name] = number
+  for number, row in enumerate(rows):
+    if row['jname']:
+      name = normalize_name(row['jname'])
+      index[name] = number
+      index['J'+name] = number
+    if row['cat3c']:
+      index[row['cat3c']] = number
+  module_logger.debug("build_table: %d rows, %d names", len(rows), len(index))
+  return rows, index
+
+def _table_is_current():
+  if not os.path.exists(cross_match_file):
+    return False
+  saved = os.path.getmtime(cross_match_file)
+  for source in source_files:
+    if os.path.exists(source) and os.path.getmtime(source) > saved:
+      return False
+  return True
+
+def get_table(rebuild=False):
+  """
+  The join table, from memory, from the saved file or built afresh
+
+  @param rebuild : build the table even if the saved one is up to date
+  @type  rebuild : bool
+
+  @return: (list of rows, dictionary of row numbers keyed by name)
+  """
+  global _table
+  if _table is not None and not rebuild:
+    record_cache('Radio_Astronomy.cross_match.get_table', True)
+    return _table
+  record_cache('Radio_Astronomy.cross_match.get_table', False)
+  table = None
+  if not rebuild and _table_is_current():
+    try:
+      with open(cross_match_file, "rb") as saved:
+        table = pickle.load(saved)
+    except (IOError, EOFError, pickle.UnpicklingError) as details:
+      module_logger.warning("get_table: bad file %s: %s",
+                            cross_match_file, details)
+      table = None
+    record_cache('Radio_Astronomy.cross_match.cross_match_file',
+                 table is not None)
+  if table is None:
+    table = build_table()
+    try:
+      with open(cross_match_file, "wb") as saved:
+        pickle.dump(table, saved, pickle.HIGHEST_PROTOCOL)
+    except IOError as details:
+      module_logger.warning("get_table: could not write %s: %s",
+                            cross_match_file, details)
+  _table = table
+  return _table
+
+@instrumented
+def lookup(name):
+  """
+  All the names and data of a source, given any of its names
+
+  @param name : J name, B name, 3C name, with or without prefix and spaces
+  @type  name : str
+
+  @return: row dictionary (see build_table) or None
+  """
+  rows, index = get_table()
+  number = index.get(normalize_name(name))
+  if number is None:
+    return None
+  return rows[number]
+
+def to_jname(name):
+  """
+  J name (without 'J') of a source, '' if it is not a VLA calibrator, None
+  if the name is not known
+  """
+  row = lookup(name)
+  return None if row is None else row['jname']
+
+def to_bname(name):
+  """
+  B name (without 'B') of a source, '' if it has none, None if the name is
+  not known
+  """
+  row = lookup(name)
+  return None if row is None else row['bname']
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Module flux_grid precomputes calibrator fluxes for an observing session.
+
+``radio_flux.get_calibrator_flux`` is evaluated once for every source on a
+grid of times and frequencies.  Later queries are answered by interpolating
+in that grid: linearly in time and in log(flux) against log(frequency),
+which is exact for power-law spectra.  Queries which fall outside the grid
+(by more than the tolerances) or in a grid cell where the flux could not be
+computed are passed to ``get_calibrator_flux``::
+
+ In [1]: import datetime
+ In [2]: from Radio_Astronomy.flux_grid import SessionFluxGrid
+ In [3]: start = datetime.datetime(2020, 1, 1, 2)
+ In [4]: times = [start + datetime.timedelta(minutes=30*i) for i in range(17)]
+ In [5]: grid = SessionFluxGrid(['3C286', 'Venus'], times, [8.4, 22., 32.])
+ In [6]: grid.flux('Venus', start + datetime.timedelta(hours=3.1), 8.45)
+"""
+import logging
+
+import numpy
+
+from Radio_Astronomy import datetime_to_seconds
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+from Radio_Astronomy.radio_flux import get_calibrator_flux
+
+module_logger = logging.getLogger(__name__)
+
+class SessionFluxGrid(object):
+  """
+  Calibrator fluxes precomputed on a (time, frequency) grid
+
+  Public attributes::
+    sources    - source names
+    times      - grid times, seconds since 1970
+    freqs      - grid frequencies in GHz
+    fluxes     - fluxes in Jy, shape (sources, times, freqs); NaN if unknown
+    refs       - origin of the flux data of each source
+    hits       - number of queries answered from the grid
+    fallbacks  - number of queries passed to get_calibrator_flux
+  """
+  def __init__(self, sources, times, freqs, time_tolerance=0.,
+               freq_tolerance=0.):
+    """
+    Evaluate the fluxes on the grid
+
+    @param sources : calibrator names
+    @type  sources : list of str
+
+    @param times : grid times, in increasing order
+    @type  times : list of datetime.datetime() instances
+
+    @param freqs : grid frequencies in GHz, in increasing order
+    @type  freqs : list of float
+
+    @param time_tolerance : how far in sec a query may be outside the grid
+                            times and still use the nearest grid time
+    @type  time_tolerance : float
+
+    @param freq_tolerance : how far in GHz a query may be outside the grid
+                            frequencies and still use the nearest one
+    @type  freq_tolerance : float
+    """
+    self.sources = list(sources)
+    self._row = dict((source, row) for row, source in enumerate(self.sources))
+    self._dates = list(times)
+    self.times = numpy.array([datetime_to_seconds(time) for time in times])
+    self.freqs = numpy.array(freqs, dtype=float)
+    if numpy.any(numpy.diff(self.times) <= 0) \
+       or numpy.any(numpy.diff(self.freqs) <= 0):
+      raise RuntimeError("grid times and frequencies must be increasing")
+    self.time_tolerance = time_tolerance
+    self.freq_tolerance = freq_tolerance
+    self.fluxes = numpy.full((len(self.sources), len(self.times),
+                              len(self.freqs)), numpy.nan)
+    self.refs = {}
+    self.hits = 0
+    self.fallbacks = 0
+    for row, source in enumerate(self.sources):
+      for column, date in enumerate(self._dates):
+        for plane, freq in enumerate(self.freqs):
+          flux, ref = get_calibrator_flux(source, float(freq), date)
+          if flux is not None:
+            self.fluxes[row, column, plane] = flux
+            self.refs[source] = ref
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+      self._log_fluxes = numpy.log10(self.fluxes)
+    self._log_freqs = numpy.log10(self.freqs)
+    module_logger.debug("SessionFluxGrid: %d fluxes computed",
+                        self.fluxes.size)
+
+  def _weights(self, grid, values, tolerance):
+    """
+    Lower grid index and interpolation weight of the upper grid point
+
+    Values outside the grid are clamped to its edge.  The mask is True for
+    values which are within the grid extended by the tolerance.
+    """
+    inside = (values >= grid[0] - tolerance) & (values <= grid[-1] + tolerance)
+    values = numpy.clip(values, grid[0], grid[-1])
+    if len(grid) == 1:
+      return numpy.zeros(values.shape, dtype=int), numpy.zeros(values.shape), \
+             inside
+    lower = numpy.clip(numpy.searchsorted(grid, values, 'right') - 1,
+                       0, len(grid) - 2)
+    weight = (values - grid[lower])/(grid[lower+1] - grid[lower])
+    return lower, weight, inside
+
+  def _interpolate(self, row, seconds, freqs):
+    """
+    Interpolated fluxes and a mask of the values which are usable
+    """
+    t_low, t_weight, t_inside = self._weights(self.times, seconds,
+                                              self.time_tolerance)
+    f_low, f_weight, f_inside = self._weights(self.freqs, freqs,
+                                              self.freq_tolerance)
+    # the frequency weight is applied in log(frequency)
+    log_f = numpy.log10(numpy.clip(freqs, self.freqs[0], self.freqs[-1]))
+    if len(self.freqs) > 1:
+      f_weight = (log_f - self._log_freqs[f_low]) \
+                 /(self._log_freqs[f_low+1] - self._log_freqs[f_low])
+    t_high = numpy.minimum(t_low + 1, len(self.times) - 1)
+    f_high = numpy.minimum(f_low + 1, len(self.freqs) - 1)
+    plane = self._log_fluxes[row]
+    log_S = (1 - t_weight)*((1 - f_weight)*plane[t_low, f_low]
+                            + f_weight*plane[t_low, f_high]) \
+            + t_weight*((1 - f_weight)*plane[t_high, f_low]
+                        + f_weight*plane[t_high, f_high])
+    S = numpy.power(10., log_S)
+    return S, t_inside & f_inside & numpy.isfinite(S)
+
+  @instrumented
+  def fluxes_at(self, source, dates, freqs):
+    """
+    Fluxes of one source for arrays of dates and frequencies
+
+    ``dates`` and ``freqs`` broadcast against each other.
+
+    @param source : calibrator name
+    @type  source : str
+
+    @param dates : dates of the observations
+    @type  dates : (array of) datetime.datetime() instances
+
+    @param freqs : frequencies in GHz
+    @type  freqs : (array of) float
+
+    @return: numpy array of fluxes in Jy, NaN where none could be found
+    """
+    date_array = numpy.asarray(dates, dtype=object)
+    seconds = numpy.vectorize(datetime_to_seconds, otypes=[float])(date_array)
+    seconds, freqs = numpy.broadcast_arrays(seconds,
+                                            numpy.asarray(freqs, dtype=float))
+    shape = seconds.shape
+    date_array = numpy.broadcast_to(date_array, shape).ravel()
+    seconds, freqs = seconds.ravel(), freqs.ravel()
+    if source in self._row:
+      S, usable = self._interpolate(self._row[source], seconds, freqs)
+    else:
+      S = numpy.full(seconds.shape, numpy.nan)
+      usable = numpy.zeros(seconds.shape, dtype=bool)
+    n_usable = int(numpy.count_nonzero(usable))
+    self.hits += n_usable
+    self.fallbacks += usable.size - n_usable
+    record_cache('Radio_Astronomy.flux_grid.SessionFluxGrid', True, n_usable)
+    record_cache('Radio_Astronomy.flux_grid.SessionFluxGrid', False,
+                 usable.size - n_usable)
+    for index in numpy.flatnonzero(~usable):
+      flux, ref = get_calibrator_flux(source, float(freqs[index]),
+                                      date_array[index])
+      S[index] = numpy.nan if flux is None else flux
+    return S.reshape(shape)
+
+  def flux(self, source, date, freq):
+    """
+    Flux of a source at a date and frequency
+
+    @param source : calibrator name
+    @type  source : str
+
+    @param date : date of the observation
+    @type  date : datetime.datetime() instance
+
+    @param freq : frequency in GHz
+    @type  freq : float
+
+    @return: flux in Jy (float), None if it is not known
+    """
+    S = float(self.fluxes_at(source, date, freq))
+    if numpy.isnan(S):
+      return None
+    return S
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Module flux_models holds flux density models of standard calibrators and
+evaluates any number of them at any number of frequencies at once.
+
+Every model is a polynomial in the logarithm of frequency::
+
+  log10(S/Jy) = a0 + a1*log10(nu) + a2*log10(nu)**2 + ...
+
+with nu in GHz times a per-model unit factor (1000 for models in MHz).
+This covers simple power laws like Ekelman's and the log-polynomials of
+Baars et al. and Perley & Butler.  The coefficients of all the models in a
+registry are kept in one contiguous array, zero-padded to the longest
+model, so that an evaluation is a few array operations however many
+sources are asked for::
+
+ In [1]: from Radio_Astronomy.flux_models import models
+ In [2]: models.flux(['3C286', '3C48', 'Virgo'], [1.4, 8.4, 22.])
+ Out[2]: array([[...]])   # 3 sources x 3 frequencies, Jy
+
+References
+==========
+Ekelman, "Radio Star Flux Density Expressions for Accurate Antenna Gain
+Measurements", COMSAT Laboratories, IEEE 1999 (frequency in MHz)
+
+Perley & Butler, ApJS 230, 7 (2017), table 6 (frequency in GHz).  3C48,
+3C138 and 3C147 are variable at the higher frequencies.
+"""
+import logging
+
+import numpy
+
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+# Ekelman (1999): log10(S) = p1 + p2*log10(f/MHz)
+Ekelman_params = {"Virgo": [6.541, -1.289],
+                  "Omega": [4.056, -0.378],
+                  "Orion": [3.317, -0.204]}
+
+# Perley & Butler (2017): log10(S) = sum(a_k*log10(f/GHz)**k)
+Perley_Butler_2017 = {
+  "3C48":  ([1.3253, -0.7553, -0.1914, 0.0498], (0.05, 50.)),
+  "3C138": ([1.0088, -0.4981, -0.1550, -0.0100, 0.0220], (0.2, 50.)),
+  "3C147": ([1.4516, -0.6961, -0.2007, 0.0640, -0.0464, 0.0289], (0.05, 50.)),
+  "3C196": ([1.2872, -0.8530, -0.1534, -0.0200, 0.0201], (0.05, 50.)),
+  "3C286": ([1.2481, -0.4507, -0.1798, 0.0357], (0.05, 50.)),
+  "3C295": ([1.4701, -0.7658, -0.2780, -0.0347, 0.0399], (0.05, 50.))}
+
+class FluxModelRegistry(object):
+  """
+  Collection of log-polynomial flux density models
+
+  Public attributes::
+    names      - model names in the order they were added
+    references - reference for each model, keyed by name
+  """
+  def __init__(self):
+    """
+    Create an empty registry
+    """
+    self.names = []
+    self.references = {}
+    self._index = {}
+    self._models = []
+    self._arrays = None
+
+  def add(self, name, coefficients, freq_unit=1., valid=(0., numpy.inf),
+          reference=""):
+    """
+    Add a model, or replace the model with the same name
+
+    @param name : source name
+    @type  name : str
+
+    @param coefficients : a0, a1, ... of log10(S) in powers of log10(nu)
+    @type  coefficients : list of float
+
+    @param freq_unit : number of model frequency units in a GHz
+    @type  freq_unit : float
+
+    @param valid : lowest and highest frequency of the model in GHz
+    @type  valid : (float, float)
+
+    @param reference : origin of the model
+    @type  reference : str
+    """
+    model = (numpy.asarray(coefficients, dtype=float), float(freq_unit),
+             float(valid[0]), float(valid[1]))
+    if name in self._index:
+      self._models[self._index[name]] = model
+    else:
+      self._index[name] = len(self.names)
+      self.names.append(name)
+      self._models.append(model)
+    self.references[name] = reference
+    self._arrays = None
+
+  def __contains__(self, name):
+    return name in self._index
+
+  def _get_arrays(self):
+    """
+    Contiguous coefficient, unit and validity arrays, made when needed
+    """
+    if self._arrays is None:
+      n_terms = max(len(model[0]) for model in self._models)
+      coefficients = numpy.zeros((len(self._models), n_terms))
+      for row, model in enumerate(self._models):
+        coefficients[row, :len(model[0])] = model[0]
+      self._arrays = (coefficients,
+                      numpy.array([model[1] for model in self._models]),
+                      numpy.array([model[2] for model in self._models]),
+                      numpy.array([model[3] for model in self._models]))
+    return self._arrays
+
+  @instrumented
+  def flux(self, names, freqs, extrapolate=False):
+    """
+    Flux densities of sources at frequencies
+
+    @param names : source names; a single name gives a 1D result
+    @type  names : str or list of str
+
+    @param freqs : frequencies in GHz
+    @type  freqs : float or array of float
+
+    @param extrapolate : evaluate outside the validity range instead of NaN
+    @type  extrapolate : bool
+
+    @return: fluxes in Jy with shape (sources,) + freqs.shape, or
+             freqs.shape for a single name
+    """
+    single = isinstance(names, str)
+    rows = numpy.array([self._index[name]
+                        for name in ([names] if single else names)], dtype=int)
+    coefficients, units, lowest, highest = self._get_arrays()
+    freqs = numpy.asarray(freqs, dtype=float)
+    # (sources, 1, ..., 1) to broadcast against the frequencies
+    shape = (len(rows),) + (1,)*freqs.ndim
+    coefficients = coefficients[rows]
+    log_freq = numpy.log10(freqs*units[rows].reshape(shape))
+    # Horner's rule over the polynomial terms
+    log_flux = coefficients[:,-1].reshape(shape)*numpy.ones_like(log_freq)
+    for term in range(coefficients.shape[1]-2, -1, -1):
+      log_flux *= log_freq
+      log_flux += coefficients[:,term].reshape(shape)
+    S = numpy.power(10., log_flux)
+    if not extrapolate:
+      outside = (freqs < lowest[rows].reshape(shape)) \
+              | (freqs > highest[rows].reshape(shape))
+      S[outside] = numpy.nan
+    if single:
+      return S[0]
+    return S
+
+def default_registry():
+  """
+  Registry with the Ekelman and Perley & Butler (2017) models
+  """
+  registry = FluxModelRegistry()
+  for name, (p1, p2) in Ekelman_params.items():
+    registry.add(name, [p1, p2], freq_unit=1000., reference="Ekelman1999")
+  for name, (coefficients, valid) in Perley_Butler_2017.items():
+    registry.add(name, coefficients, valid=valid, reference="PerleyButler2017")
+  return registry
+
+models = default_registry()
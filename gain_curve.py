@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Module gain_curve derives antenna gain (K/Jy, cf. ``antenna_gain``) as a
+function of elevation from calibrator scans.
+
+The measured antenna temperatures are divided by the fluxes expected from
+``radio_flux.get_calibrator_flux`` and a polynomial in elevation is fitted
+to the gains in each waveguide band (see ``bands``)::
+
+  G(el) = a0 + a1*el + a2*el**2 + ...
+
+All the bands are fitted together: the normal equations of every band are
+accumulated with ``numpy.bincount`` and solved in one batched call, so a
+fit over the whole scan history is a few array operations::
+
+ In [1]: from Radio_Astronomy.gain_curve import fit_gain_curves
+ In [2]: fit = fit_gain_curves(Ta, elevation, freq, sources, dates)
+ In [3]: fit['bands'], fit['coefficients'], fit['rms']
+"""
+import logging
+
+import numpy
+
+from Radio_Astronomy.bands import frequencies_to_bands
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+
+module_logger = logging.getLogger(__name__)
+
+@instrumented
+def expected_fluxes(sources, freqs, dates):
+  """
+  Calibrator fluxes for many scans
+
+  get_calibrator_flux is called once for each distinct source, frequency
+  and day; scans which share them share the result.
+
+  @param sources : calibrator names
+  @type  sources : array of str
+
+  @param freqs : frequencies in GHz
+  @type  freqs : array of float
+
+  @param dates : dates of the scans
+  @type  dates : datetime.datetime() instance or array of them
+
+  @return: numpy array of fluxes in Jy, NaN where none is known
+  """
+  from Radio_Astronomy.radio_flux import get_calibrator_flux
+  sources = numpy.asarray(sources)
+  freqs = numpy.asarray(freqs, dtype=float)
+  dates = numpy.asarray(dates, dtype=object)
+  sources, freqs, dates = numpy.broadcast_arrays(sources, freqs, dates)
+  S = numpy.full(sources.shape, numpy.nan)
+  known = {}
+  for index in numpy.ndindex(sources.shape):
+    date = dates[index]
+    key = (sources[index], freqs[index], date.date())
+    if key in known:
+      record_cache('Radio_Astronomy.gain_curve.expected_fluxes', True)
+    else:
+      record_cache('Radio_Astronomy.gain_curve.expected_fluxes', False)
+      flux, ref = get_calibrator_flux(str(key[0]), float(key[1]), date)
+      known[key] = numpy.nan if flux is None else flux
+    S[index] = known[key]
+  module_logger.debug("expected_fluxes: %d scans, %d look-ups",
+                      S.size, len(known))
+  return S
+
+@instrumented
+def fit_gain_curves(Ta, elevation, freqs, sources=None, dates=None,
+                    fluxes=None, degree=2):
+  """
+  Fit gain against elevation for each band
+
+  Either fluxes, or sources and dates, must be given.  Scans without an
+  expected flux, or with a non-finite Ta, are left out of the fits.  Bands
+  with fewer usable scans, or fewer distinct elevations, than coefficients
+  get NaN coefficients.
+
+  @param Ta : measured antenna temperatures in K
+  @type  Ta : array of float
+
+  @param elevation : elevations in degrees
+  @type  elevation : array of float
+
+  @param freqs : frequencies in GHz
+  @type  freqs : array of float
+
+  @param sources : calibrator names
+  @type  sources : array of str
+
+  @param dates : dates of the scans
+  @type  dates : datetime.datetime() instance or array of them
+
+  @param fluxes : expected fluxes in Jy, instead of sources and dates
+  @type  fluxes : array of float
+
+  @param degree : degree of the polynomial in elevation
+  @type  degree : int
+
+  @return: dictionary with::
+    bands        - band codes, one per fit
+    coefficients - a0, a1, ... for each band, shape (bands, degree+1)
+    counts       - number of scans used in each fit
+    rms          - r.m.s. residual of each fit in K/Jy
+    gain         - measured gain of each scan in K/Jy
+    residuals    - gain minus fitted gain of each scan, NaN if unused
+    band_index   - row of 'bands' for each scan
+  """
+  Ta = numpy.asarray(Ta, dtype=float).ravel()
+  elevation = numpy.asarray(elevation, dtype=float).ravel()
+  freqs = numpy.broadcast_to(numpy.asarray(freqs, dtype=float),
+                             Ta.shape).ravel()
+  if fluxes is None:
+    if sources is None or dates is None:
+      raise RuntimeError("fit_gain_curves needs fluxes or sources and dates")
+    fluxes = expected_fluxes(numpy.broadcast_to(sources, Ta.shape),
+                             freqs, dates)
+  fluxes = numpy.broadcast_to(numpy.asarray(fluxes, dtype=float),
+                              Ta.shape).ravel()
+  with numpy.errstate(invalid='ignore', divide='ignore'):
+    gain = Ta/fluxes
+  bands, band_index = numpy.unique(frequencies_to_bands(freqs),
+                                   return_inverse=True)
+  band_index = band_index.ravel()
+  usable = numpy.isfinite(gain) & numpy.isfinite(elevation)
+  n_bands, n_terms = len(bands), degree + 1
+  # powers of elevation up to 2*degree for the normal equations, in units
+  # of 90 deg to keep them well conditioned
+  powers = numpy.power.outer(numpy.where(usable, elevation/90., 0.),
+                             numpy.arange(2*degree + 1))
+  weights = usable.astype(float)
+  # sums of el**k and of gain*el**k for each band
+  sums = numpy.empty((n_bands, 2*degree + 1))
+  rhs = numpy.empty((n_bands, n_terms))
+  zeroed_gain = numpy.where(usable, gain, 0.)
+  for k in range(2*degree + 1):
+    sums[:,k] = numpy.bincount(band_index, weights*powers[:,k],
+                               minlength=n_bands)
+  for k in range(n_terms):
+    rhs[:,k] = numpy.bincount(band_index, zeroed_gain*powers[:,k],
+                              minlength=n_bands)
+  counts = sums[:,0].astype(int)
+  terms = numpy.arange(n_terms)
+  normal = sums[:, terms[:,None] + terms[None,:]]
+  solvable = counts >= n_terms
+  # a band whose scans have too few distinct elevations has a singular
+  # matrix, which would make the batched solve fail for every band
+  if solvable.any():
+    solvable[solvable] = numpy.linalg.matrix_rank(normal[solvable]) == n_terms
+  coefficients = numpy.full((n_bands, n_terms), numpy.nan)
+  if solvable.any():
+    coefficients[solvable] = numpy.linalg.solve(normal[solvable],
+                                                rhs[solvable][...,None])[...,0]
+  model = numpy.einsum('ij,ij->i', coefficients[band_index],
+                       powers[:,:n_terms])
+  residuals = numpy.where(usable, gain - model, numpy.nan)
+  coefficients /= numpy.power(90., terms)
+  with numpy.errstate(invalid='ignore', divide='ignore'):
+    rms = numpy.sqrt(numpy.bincount(band_index,
+                                    numpy.where(usable, residuals, 0.)**2,
+                                    minlength=n_bands)/counts)
+  rms[~solvable] = numpy.nan
+  module_logger.info("fit_gain_curves: %d scans, %d bands", usable.sum(),
+                     n_bands)
+  return {'bands': bands, 'coefficients': coefficients, 'counts': counts,
+          'rms': rms, 'gain': gain, 'residuals': residuals,
+          'band_index': band_index}
+
+def gain_at(fit, band, elevation):
+  """
+  Fitted gain of a band at elevations
+
+  @param fit : result of fit_gain_curves
+  @type  fit : dict
+
+  @param band : band code
+  @type  band : str
+
+  @param elevation : elevations in degrees
+  @type  elevation : (array of) float
+
+  @return: gain in K/Jy
+  """
+  row = numpy.flatnonzero(fit['bands'] == band)
+  if len(row) == 0:
+    raise RuntimeError("no gain curve for band "+str(band))
+  # numpy.polyval wants the highest power first
+  return numpy.polyval(fit['coefficients'][row[0]][::-1], elevation)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Module instrumentation records how often the package's public functions
+are called, how long they take and how well their caches work.
+
+Recording is off by default and a disabled instrumented function costs one
+extra function call and a flag test.  It is turned on with the environment
+variable ``RADIO_ASTRONOMY_PROFILE`` (any non-empty value other than '0')
+or from Python::
+
+ In [1]: from Radio_Astronomy import instrumentation
+ In [2]: instrumentation.enable()
+ In [3]: ... # do some work
+ In [4]: print(instrumentation.format_report())
+ In [5]: instrumentation.dump('profile.json')
+
+If ``RADIO_ASTRONOMY_PROFILE_FILE`` is also set, the report is written to
+that file when the interpreter exits.
+
+Latency percentiles are computed from the most recent ``max_samples``
+calls of each function; counts and cumulative times cover all calls since
+the last ``reset()``.
+"""
+import atexit
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+import numpy
+
+max_samples = 10000
+
+_enabled = os.environ.get('RADIO_ASTRONOMY_PROFILE', '') not in ('', '0')
+_lock = threading.Lock()
+_calls = {}
+_caches = {}
+
+class _CallStats(object):
+  """
+  Call count, cumulative time and recent latencies of one function
+  """
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0.
+    self.samples = collections.deque(maxlen=max_samples)
+
+def enable():
+  """
+  Start recording
+  """
+  global _enabled
+  _enabled = True
+
+def disable():
+  """
+  Stop recording; what was recorded is kept
+  """
+  global _enabled
+  _enabled = False
+
+def is_enabled():
+  """
+  True if calls are being recorded
+  """
+  return _enabled
+
+def reset():
+  """
+  Forget everything recorded so far
+  """
+  with _lock:
+    _calls.clear()
+    _caches.clear()
+
+def _record_call(name, duration, failed):
+  with _lock:
+    try:
+      stats = _calls[name]
+    except KeyError:
+      stats = _calls[name] = _CallStats()
+    stats.count += 1
+    stats.total += duration
+    stats.samples.append(duration)
+    if failed:
+      stats.errors += 1
+
+def instrumented(func):
+  """
+  Decorator which records calls of a function while recording is enabled
+
+  The function is reported under its module and qualified name.
+  """
+  name = func.__module__ + '.' + func.__qualname__
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    if not _enabled:
+      return func(*args, **kwargs)
+    failed = True
+    start = time.perf_counter()
+    try:
+      result = func(*args, **kwargs)
+      failed = False
+      return result
+    finally:
+      _record_call(name, time.perf_counter() - start, failed)
+  return wrapper
+
+def record_cache(name, hit, count=1):
+  """
+  Count cache hits or misses while recording is enabled
+
+  @param name : name of the cache, usually the function which uses it
+  @type  name : str
+
+  @param hit : True for hits, False for misses
+  @type  hit : bool
+
+  @param count : number of hits or misses
+  @type  count : int
+  """
+  if not _enabled or count == 0:
+    return
+  with _lock:
+    counts = _caches.setdefault(name, [0, 0])
+    counts[0 if hit else 1] += count
+
+def report():
+  """
+  What has been recorded, as a dictionary
+
+  'calls' is keyed by function name.  Each entry has the count, the number
+  of calls which raised an exception, the cumulative time and the mean and
+  50th/90th/99th percentile latencies in seconds.  'caches' is keyed by
+  cache name with the hits, misses and hit rate.
+
+  @return: dict
+  """
+  with _lock:
+    calls = dict((name, (stats.count, stats.errors, stats.total,
+                         numpy.array(stats.samples)))
+                 for name, stats in _calls.items())
+    caches = dict((name, tuple(counts)) for name, counts in _caches.items())
+  result = {'calls': {}, 'caches': {}}
+  for name, (count, errors, total, samples) in calls.items():
+    p50, p90, p99 = numpy.percentile(samples, [50, 90, 99])
+    result['calls'][name] = {'count': count, 'errors': errors,
+                             'total_s': total, 'mean_s': total/count,
+                             'p50_s': float(p50), 'p90_s': float(p90),
+                             'p99_s': float(p99)}
+  for name, (hits, misses) in caches.items():
+    result['caches'][name] = {'hits': hits, 'misses': misses,
+                              'hit_rate': hits/float(hits + misses)}
+  return result
+
+def format_report():
+  """
+  The report as a table, slowest cumulative time first
+  """
+  data = report()
+  lines = ["%-50s %8s %10s %10s %10s %10s" % ("function", "calls", "total s",
+                                              "p50 ms", "p90 ms", "p99 ms")]
+  for name, stats in sorted(data['calls'].items(),
+                            key=lambda item: -item[1]['total_s']):
+    lines.append("%-50s %8d %10.3f %10.3f %10.3f %10.3f" % (name,
+                 stats['count'], stats['total_s'], stats['p50_s']*1e3,
+                 stats['p90_s']*1e3, stats['p99_s']*1e3))
+  if data['caches']:
+    lines.append("")
+    lines.append("%-50s %8s %10s %10s" % ("cache", "hits", "misses",
+                                          "hit rate"))
+    for name, stats in sorted(data['caches'].items()):
+      lines.append("%-50s %8d %10d %10.3f" % (name, stats['hits'],
+                   stats['misses'], stats['hit_rate']))
+  return "\n".join(lines)
+
+def dump(filename):
+  """
+  Write the report to a JSON file
+  """
+  with open(filename, 'w') as outfile:
+    json.dump(report(), outfile, indent=1, sort_keys=True)
+
+def _dump_at_exit():
+  filename = os.environ.get('RADIO_ASTRONOMY_PROFILE_FILE')
+  if filename and (_calls or _caches):
+    dump(filename)
+
+atexit.register(_dump_at_exit)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Module line_planner predicts where spectral lines from moving sources will
+appear in the spectrometers.
+
+For every combination of source velocity, line rest frequency and
+spectrometer setup it gives the sky frequency, the waveguide band and the
+channel, all in one call.  For example, for the water line in all the
+masers of the H2O maser catalogue and two 16k-channel spectrometers::
+
+ In [1]: from Radio_Astronomy.masers import get_maser_catalog
+ In [2]: from Radio_Astronomy.line_planner import *
+ In [3]: masers = get_maser_catalog()
+ In [4]: plan = plan_lines(masers['Vsys']*1e3, H2O_line,
+                           [21.9e9, 22.0e9], 500e6, 16384)
+ In [5]: plan['channel'].shape
+ Out[5]: (139, 1, 2)
+
+A spectrometer setup is given by the frequency of its first channel, its
+bandwidth and its number of channels.
+"""
+import logging
+
+import numpy
+
+from Radio_Astronomy import freqs_to_chans, sky_frequency
+from Radio_Astronomy.bands import frequencies_to_bands
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+H2O_line = 22.23508e9 # Hz, 6(1,6)-5(2,3) water maser line
+
+@instrumented
+def plan_lines(velocities, rest_freqs, band_start, bandwidth, n_chans,
+               convention="radio"):
+  """
+  Sky frequencies, bands and channels of spectral lines
+
+  'sky_freq' and 'band' have the shape (velocities, lines) and 'channel'
+  and 'in_band' the shape (velocities, lines, setups), with dimensions of
+  length one for scalar arguments.  A line which falls outside a
+  spectrometer gets channel -1 for that setup.
+
+  @param velocities : source velocities in m/s
+  @type  velocities : (numpy array of) float
+
+  @param rest_freqs : line rest frequencies in Hz
+  @type  rest_freqs : (numpy array of) float
+
+  @param band_start : frequency of the first channel of each setup in Hz
+  @type  band_start : (numpy array of) float
+
+  @param bandwidth : bandwidth of each setup in Hz
+  @type  bandwidth : (numpy array of) float
+
+  @param n_chans : number of channels of each setup
+  @type  n_chans : (numpy array of) int
+
+  @param convention : 'radio', 'optical' or 'relativistic'
+  @type  convention : str
+
+  @return: dictionary with 'sky_freq' (Hz), 'band' (code), 'channel',
+           'in_band' (bool)
+  """
+  velocities = numpy.atleast_1d(numpy.asarray(velocities, dtype=float))
+  rest_freqs = numpy.atleast_1d(numpy.asarray(rest_freqs, dtype=float))
+  band_start, bandwidth, n_chans = numpy.broadcast_arrays(
+                                       numpy.atleast_1d(band_start),
+                                       numpy.atleast_1d(bandwidth),
+                                       numpy.atleast_1d(n_chans))
+  sky_freq = sky_frequency(velocities[:,numpy.newaxis], rest_freqs,
+                           convention=convention)
+  offset = sky_freq[:,:,numpy.newaxis] - band_start
+  # negative offsets would be counted from the top of the band
+  in_band = (offset >= 0) & (offset <= bandwidth)
+  channel = freqs_to_chans(numpy.where(in_band, offset, 0), bandwidth, n_chans)
+  channel[~in_band] = -1
+  module_logger.debug("plan_lines: %d of %d lines in band",
+                      numpy.count_nonzero(in_band), in_band.size)
+  return {'sky_freq': sky_freq,
+          'band':     frequencies_to_bands(sky_freq/1e9),
+          'channel':  channel,
+          'in_band':  in_band}
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Module lookup_daemon answers calibrator coordinate and flux queries from a
+long-running local process.
+
+A shell script which runs a Python snippet for each look-up pays for
+starting the interpreter, importing scipy and ephem and unpickling the
+catalogues every time.  The daemon does that once and then answers
+batched queries on a Unix socket, one JSON object per line::
+
+  $ python -m Radio_Astronomy.lookup_daemon serve &
+  $ python -m Radio_Astronomy.lookup_daemon coords 3C286 J0319+415
+  $ python -m Radio_Astronomy.lookup_daemon flux --freq 22 3C286 Venus
+  $ python -m Radio_Astronomy.lookup_daemon stop
+
+If no daemon is running, the client answers the query itself, so scripts
+work either way, only more slowly.  'ping' and 'stop' are about the daemon
+itself; they fail, with exit status 1, when there is none.  From Python::
+
+ In [1]: from Radio_Astronomy.lookup_daemon import query
+ In [2]: query({'op': 'flux', 'names': ['3C286'], 'freq': 8.4})
+
+Requests have an 'op' of 'ping', 'coords', 'flux' or 'shutdown'.  'coords'
+and 'flux' take a list of 'names'; 'flux' also takes 'freq' in GHz (one
+value, or one per name) and an ISO 'date' (default: now, UT).  Replies are
+``{"ok": true, "results": [...]}`` or ``{"ok": false, "error": "..."}``.
+A 'flux' result is ``[flux in Jy, origin, error]``; the error is null unless
+the look-up of that name failed.
+
+The socket is ``$RADIO_ASTRONOMY_SOCKET`` or, by default, a file in the
+temporary directory named after the user.
+"""
+import datetime
+import json
+import logging
+import math
+import os
+import pickle
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+from Radio_Astronomy import cal_dir
+from Radio_Astronomy.sexagesimal import parse_angles
+
+module_logger = logging.getLogger(__name__)
+
+_local_service = None
+
+def default_socket_path():
+  """
+  Path of the daemon's socket
+  """
+  return os.environ.get('RADIO_ASTRONOMY_SOCKET',
+                        os.path.join(tempfile.gettempdir(),
+                                     "radio_astronomy-%d.sock" % os.getuid()))
+
+class LookupService(object):
+  """
+  Warm catalogues and the request handler which uses them
+  """
+  def __init__(self):
+    """
+    Load the catalogues and the flux modules
+    """
+    from Radio_Astronomy import cross_match
+    from Radio_Astronomy.radio_flux import get_calibrator_flux
+    self._lookup = cross_match.lookup
+    self._get_calibrator_flux = get_calibrator_flux
+    cross_match.get_table()
+    self._coords_3C = self._load_3C_coords()
+    self.requests = 0
+
+  @staticmethod
+  def _load_3C_coords():
+    """
+    3C_VLA_cals with its formatted coordinates converted to hours and degrees
+    """
+    try:
+      with open(os.path.join(cal_dir, "3C_VLA_cals"), "rb") as dbfile:
+        formatted = pickle.load(dbfile)
+    except IOError as details:
+      module_logger.warning("LookupService: no 3C_VLA_cals: %s", details)
+      return {}
+    names = list(formatted)
+    ra, ra_ok = parse_angles([formatted[name][0] for name in names], 'hours')
+    dec, dec_ok = parse_angles([formatted[name][1] for name in names],
+                               'degrees')
+    coords = {}
+    for number, name in enumerate(names):
+      if ra_ok[number] and dec_ok[number]:
+        coords[name] = (math.degrees(ra[number])/15.,
+                        math.degrees(dec[number]), formatted[name][2])
+      else:
+        module_logger.warning("LookupService: bad position for %s", name)
+    return coords
+
+  def coords(self, name):
+    """
+    J2000 position and names of a source
+
+    @return: dict with 'name', 'jname', 'bname', 'cat3c', 'ra' in hours and
+             'dec' in degrees, or None if the source is not known
+    """
+    row = self._lookup(name)
+    if row is not None and row['vla'] is not None:
+      return {'name': name, 'jname': row['jname'], 'bname': row['bname'],
+              'cat3c': row['cat3c'], 'ra': row['vla']['ra'],
+              'dec': row['vla']['dec']}
+    key = "".join(name.split()).upper()
+    if key in self._coords_3C:
+      ra, dec, iau = self._coords_3C[key]
+      return {'name': name, 'jname': iau, 'bname': '', 'cat3c': key,
+              'ra': ra, 'dec': dec}
+    return None
+
+  def flux(self, name, freq, date):
+    """
+    Flux of a source, as from radio_flux.get_calibrator_flux
+
+    @return: [flux in Jy or None, origin of the flux or None,
+              error text or None]
+    """
+    try:
+      flux, ref = self._get_calibrator_flux(name, freq, date)
+    except Exception as details:
+      module_logger.debug("flux: %s: %s", name, details)
+      return [None, None, "%s: %s" % (type(details).__name__, details)]
+    return [None if flux is None else float(flux), ref, None]
+
+  def handle(self, request):
+    """
+    Answer one request
+
+    @param request : decoded JSON request
+    @type  request : dict
+
+    @return: reply dict
+    """
+    self.requests += 1
+    try:
+      op = request['op']
+      if op == 'ping':
+        return {'ok': True, 'results': [self.requests]}
+      names = list(request.get('names', []))
+      if op == 'coords':
+        return {'ok': True, 'results': [self.coords(name) for name in names]}
+      if op == 'flux':
+        freqs = request['freq']
+        if not isinstance(freqs, list):
+          freqs = [freqs]*len(names)
+        if len(freqs) != len(names):
+          raise RuntimeError("need one frequency, or one per name")
+        if request.get('date'):
+          date = datetime.datetime.fromisoformat(request['date'])
+        else:
+          date = datetime.datetime.now(datetime.timezone.utc) \
+                                  .replace(tzinfo=None)
+        return {'ok': True,
+                'results': [self.flux(name, float(freq), date)
+                            for name, freq in zip(names, freqs)]}
+      raise RuntimeError("unknown op: %s" % op)
+    except Exception as details:
+      return {'ok': False, 'error': "%s: %s" % (type(details).__name__,
+                                                details)}
+
+class _Handler(socketserver.StreamRequestHandler):
+  """
+  Reads JSON requests, one per line, until the client closes
+  """
+  def handle(self):
+    for line in self.rfile:
+      if not line.strip():
+        continue
+      try:
+        request = json.loads(line.decode('utf-8'))
+      except ValueError as details:
+        reply = {'ok': False, 'error': "bad request: %s" % details}
+      else:
+        if isinstance(request, dict) and request.get('op') == 'shutdown':
+          self._reply({'ok': True, 'results': []})
+          # shutdown() waits for serve_forever(), so not in this thread
+          threading.Thread(target=self.server.shutdown).start()
+          return
+        reply = self.server.service.handle(request)
+      self._reply(reply)
+
+  def _reply(self, reply):
+    self.wfile.write(json.dumps(reply).encode('utf-8') + b"\n")
+    self.wfile.flush()
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+def serve(path=None):
+  """
+  Run the daemon until it is sent a 'shutdown' request
+
+  A socket file left by a daemon which is no longer running is replaced.
+
+  @param path : socket path; default: default_socket_path()
+  @type  path : str
+  """
+  if path is None:
+    path = default_socket_path()
+  if os.path.exists(path):
+    connection = _connect(path)
+    if connection is not None:
+      connection.close()
+      raise RuntimeError("a daemon is already listening on " + path)
+    os.unlink(path)
+  service = LookupService()
+  server = _Server(path, _Handler)
+  server.service = service
+  os.chmod(path, 0o600)
+  module_logger.info("serve: listening on %s", path)
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+    if os.path.exists(path):
+      os.unlink(path)
+    module_logger.info("serve: stopped after %d requests", service.requests)
+
+def _connect(path):
+  """
+  Socket connected to the daemon, None if there is none
+  """
+  connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    connection.connect(path)
+  except (FileNotFoundError, ConnectionRefusedError):
+    connection.close()
+    return None
+  return connection
+
+def query(request, path=None, fallback=True):
+  """
+  Send a request to the daemon, or answer it here if none is running
+
+  @param request : request, see the module documentation
+  @type  request : dict
+
+  @param path : socket path; default: default_socket_path()
+  @type  path : str
+
+  @param fallback : answer the request in this process if there is no
+                    daemon; otherwise raise RuntimeError
+  @type  fallback : bool
+
+  @return: reply dict
+  """
+  global _local_service
+  connection = _connect(path or default_socket_path())
+  if connection is None:
+    if not fallback:
+      raise RuntimeError("no lookup daemon is running")
+    if request.get('op') == 'shutdown':
+      return {'ok': True, 'results': []}
+    if _local_service is None:
+      module_logger.debug("query: no daemon; loading catalogues here")
+      _local_service = LookupService()
+    return _local_service.handle(request)
+  with connection:
+    connection.sendall(json.dumps(request).encode('utf-8') + b"\n")
+    reply = b""
+    while not reply.endswith(b"\n"):
+      data = connection.recv(65536)
+      if not data:
+        break
+      reply += data
+  return json.loads(reply.decode('utf-8'))
+
+def main(argv=None):
+  """
+  Command-line entry point; run with --help for the usage
+  """
+  import argparse
+  parser = argparse.ArgumentParser(
+               prog="python -m Radio_Astronomy.lookup_daemon",
+               description="Calibrator look-ups through a warm daemon")
+  parser.add_argument('command',
+                      choices=['serve', 'stop', 'ping', 'coords', 'flux'])
+  parser.add_argument('names', nargs='*', help="source names")
+  parser.add_argument('--freq', type=float, help="frequency in GHz")
+  parser.add_argument('--date', help="ISO date and time, UT; default: now")
+  parser.add_argument('--socket', help="socket path")
+  parser.add_argument('--json', action='store_true',
+                      help="print the reply as JSON")
+  args = parser.parse_intermixed_args(argv)
+  if args.command == 'serve':
+    logging.basicConfig(level=logging.INFO)
+    serve(args.socket)
+    return 0
+  op = {'stop': 'shutdown'}.get(args.command, args.command)
+  request = {'op': op, 'names': args.names}
+  if op == 'flux':
+    if args.freq is None:
+      parser.error("flux needs --freq")
+    request['freq'] = args.freq
+    request['date'] = args.date
+  try:
+    # ping and stop are questions about the daemon, not the catalogues
+    reply = query(request, args.socket, fallback=op not in ('ping', 'shutdown'))
+  except RuntimeError as details:
+    print(details, file=sys.stderr)
+    return 1
+  if args.json or not reply['ok']:
+    print(json.dumps(reply))
+    return 0 if reply['ok'] else 1
+  if op == 'ping':
+    print("daemon has answered %d requests" % reply['results'][0])
+  elif op == 'coords':
+    for name, result in zip(args.names, reply['results']):
+      if result is None:
+        print(name)
+      else:
+        print("\t".join(str(result[key])
+                        for key in ['name', 'ra', 'dec', 'jname', 'bname',
+                                    'cat3c']))
+  elif op == 'flux':
+    for name, (flux, ref, error) in zip(args.names, reply['results']):
+      if error is None:
+        print("%s\t%s\t%s" % (name, flux, ref))
+      else:
+        print("%s\t%s\t%s\t%s" % (name, flux, ref, error))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
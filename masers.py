@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Module masers provides the catalogue of H2O masers in active galactic
+nuclei, ``masers_H2O_AGN.txt``, as a numpy structured array.
+
+The text file mixes tabs and spaces between columns and some names contain
+spaces, so it is parsed once and the result is kept in a binary file,
+``masers_H2O_AGN.npy``, next to it.  The binary file is remade whenever the
+text file is newer.
+
+The fields of the catalogue are::
+  name      - source name
+  ra        - J2000 right ascension in radians
+  dec       - J2000 declination in radians
+  Vsys      - systemic velocity in km/s, NaN if only a redshift is given
+  z         - redshift, NaN if a velocity is given
+  type      - 'Disk', 'Jet', 'Other' or a combination like 'Disk/Jet'
+  reference - reference code, '' if there is none
+
+Examples::
+
+ In [1]: from Radio_Astronomy.masers import *
+ In [2]: disks = select_masers(maser_type='Disk', vmin=1000, vmax=5000)
+ In [3]: disks['name']
+"""
+import logging
+import os
+import re
+
+import numpy
+
+from Radio_Astronomy import angular_separation, cal_dir
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+from Radio_Astronomy.sexagesimal import parse_angles
+
+module_logger = logging.getLogger(__name__)
+
+maser_file = os.path.join(cal_dir, "masers_H2O_AGN.txt")
+cache_file = os.path.join(cal_dir, "masers_H2O_AGN.npy")
+
+# fields of the catalogue; the string widths are those of the longest values
+maser_fields = [('name',      'U'),
+                ('ra',        'f8'),
+                ('dec',       'f8'),
+                ('Vsys',      'f8'),
+                ('z',         'f8'),
+                ('type',      'U'),
+                ('reference', 'U')]
+
+def maser_dtype(records):
+  """
+  Structured dtype with string fields wide enough for all the records
+
+  @param records : catalogue rows as tuples in the order of maser_fields
+  @type  records : list of tuples
+
+  @return: numpy.dtype
+  """
+  fields = []
+  for column, (name, kind) in enumerate(maser_fields):
+    if kind == 'U':
+      width = max([len(record[column]) for record in records] + [1])
+      kind = 'U%d' % width
+    fields.append((name, kind))
+  return numpy.dtype(fields)
+
+def _has_maser_fields(catalog):
+  """
+  Whether an array has the fields of the catalogue, with any string widths
+  """
+  if catalog.dtype.names != tuple(name for name, kind in maser_fields):
+    return False
+  return all(catalog.dtype[name].kind == kind[0]
+             for name, kind in maser_fields)
+
+# name, RA, dec, velocity or redshift, type, reference
+line_pattern = re.compile(r"""^\s*(?P<name>\S.*?)\s+
+                              (?P<ra>\d{1,2}:\d{1,2}:\d{1,2}(?:\.\d*)?)\s+
+                              (?P<dec>[+-]?\d{1,2}:\d{1,2}:\d{1,2}(?:\.\d*)?)\s+
+                              (?P<vsys>z=[\d.]+|[+-]?\d+(?:\.\d*)?)\s+
+                              (?P<type>\S+)
+                              (?:\s+(?P<ref>\S+))?\s*$""", re.VERBOSE)
+
+_catalog = None
+_index = None
+
+@instrumented
+def parse_maser_file(filename=maser_file):
+  """
+  Parses the maser catalogue text file
+
+  Lines which cannot be parsed are logged and skipped.
+
+  @param filename : path to the text file
+  @type  filename : str
+
+  @return: numpy structured array with the fields of maser_fields
+  """
+  records = []
+  positions = []
+  with open(filename, 'r') as textfile:
+    lines = textfile.read().splitlines()
+  # the first line has the column headings
+  for line in lines[1:]:
+    if line.strip() == '':
+      continue
+    match = line_pattern.match(line.replace('\t', ' '))
+    if match is None:
+      module_logger.warning("parse_maser_file: could not parse: %s", line)
+      continue
+    velocity = match.group('vsys')
+    if velocity.startswith('z='):
+      Vsys, z = numpy.nan, float(velocity[2:])
+    else:
+      Vsys, z = float(velocity), numpy.nan
+    records.append((match.group('name'), numpy.nan, numpy.nan, Vsys, z,
+                    match.group('type'), match.group('ref') or ''))
+    positions.append((match.group('ra'), match.group('dec')))
+  catalog = numpy.array(records, dtype=maser_dtype(records))
+  if len(catalog):
+    # all the coordinates at once
+    ra_text, dec_text = zip(*positions)
+    catalog['ra'], ra_ok = parse_angles(ra_text, 'hours')
+    catalog['dec'], dec_ok = parse_angles(dec_text, 'degrees')
+    for number in numpy.flatnonzero(~(ra_ok & dec_ok)):
+      module_logger.warning("parse_maser_file: bad position for %s: %s %s",
+                            catalog['name'][number], *positions[number])
+    catalog = catalog[ra_ok & dec_ok]
+  module_logger.debug("parse_maser_file: %d masers", len(catalog))
+  return catalog
+
+@instrumented
+def get_maser_catalog(reload=False):
+  """
+  Returns the maser catalogue
+
+  The catalogue is read from the binary cache if that is up to date,
+  otherwise the text file is parsed and the cache is rewritten.  The
+  result is kept in memory for later calls.
+
+  @param reload : force parsing of the text file
+  @type  reload : bool
+
+  @return: numpy structured array with the fields of maser_fields
+  """
+  global _catalog, _index
+  if _catalog is not None and not reload:
+    record_cache('Radio_Astronomy.masers.get_maser_catalog', True)
+    return _catalog
+  record_cache('Radio_Astronomy.masers.get_maser_catalog', False)
+  catalog = None
+  if not reload and os.path.exists(cache_file) \
+     and os.path.getmtime(cache_file) >= os.path.getmtime(maser_file):
+    try:
+      catalog = numpy.load(cache_file, allow_pickle=False)
+    except (IOError, ValueError) as details:
+      module_logger.warning("get_maser_catalog: bad cache file: %s", details)
+      catalog = None
+    else:
+      if not _has_maser_fields(catalog):
+        catalog = None
+    record_cache('Radio_Astronomy.masers.cache_file', catalog is not None)
+  if catalog is None:
+    catalog = parse_maser_file()
+    try:
+      numpy.save(cache_file, catalog, allow_pickle=False)
+    except IOError as details:
+      module_logger.warning("get_maser_catalog: could not write %s: %s",
+                            cache_file, details)
+  _catalog = catalog
+  _index = _make_index(catalog)
+  return _catalog
+
+def _make_index(catalog):
+  """
+  Velocity order and per type row numbers of the catalogue
+  """
+  index = {}
+  # NaN velocities sort to the end
+  index['Vsys_order'] = numpy.argsort(catalog['Vsys'], kind='stable')
+  index['Vsys_sorted'] = catalog['Vsys'][index['Vsys_order']]
+  types = {}
+  for row in range(len(catalog)):
+    for maser_type in catalog['type'][row].split('/'):
+      types.setdefault(maser_type.lower(), []).append(row)
+  index['type'] = dict((key, numpy.array(value))
+                       for key, value in types.items())
+  return index
+
+@instrumented
+def select_masers(ra=None, dec=None, radius=None, vmin=None, vmax=None,
+                  maser_type=None):
+  """
+  Masers satisfying all the given conditions
+
+  A position query needs ``ra``, ``dec`` and ``radius``.  A velocity window
+  can be open on either side.  A type matches any part of a combined type,
+  so 'Jet' also selects 'Disk/Jet'.  Upper and lower case are equivalent.
+
+  @param ra : right ascension of the search centre (rad)
+  @type  ra : float
+
+  @param dec : declination of the search centre (rad)
+  @type  dec : float
+
+  @param radius : search radius (rad)
+  @type  radius : float
+
+  @param vmin : lowest systemic velocity (km/s)
+  @type  vmin : float
+
+  @param vmax : highest systemic velocity (km/s)
+  @type  vmax : float
+
+  @param maser_type : 'Disk', 'Jet' or 'Other'
+  @type  maser_type : str
+
+  @return: numpy structured array of the selected masers, catalogue order
+  """
+  catalog = get_maser_catalog()
+  selected = numpy.ones(len(catalog), dtype=bool)
+  if vmin is not None or vmax is not None:
+    sorted_V = _index['Vsys_sorted']
+    first = 0 if vmin is None else numpy.searchsorted(sorted_V, vmin, 'left')
+    last = numpy.count_nonzero(~numpy.isnan(sorted_V)) if vmax is None \
+           else numpy.searchsorted(sorted_V, vmax, 'right')
+    in_window = numpy.zeros(len(catalog), dtype=bool)
+    in_window[_index['Vsys_order'][first:last]] = True
+    selected &= in_window
+  if maser_type is not None:
+    of_type = numpy.zeros(len(catalog), dtype=bool)
+    of_type[_index['type'].get(maser_type.lower(), [])] = True
+    selected &= of_type
+  if radius is not None:
+    if ra is None or dec is None:
+      raise RuntimeError("a position query needs ra, dec and radius")
+    candidates = numpy.flatnonzero(selected)
+    near = angular_separation(ra, dec, catalog['ra'][candidates],
+                              catalog['dec'][candidates]) <= radius
+    selected[:] = False
+    selected[candidates[near]] = True
+  return catalog[selected]
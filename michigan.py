@@ -19,6 +19,7 @@ from numpy import array
 from scipy import polyfit, polyval
 
 from Radio_Astronomy import cal_dir
+from Radio_Astronomy.instrumentation import instrumented
 from support import nearest_index
 
 diag = True
@@ -32,6 +33,7 @@ pickle_file.close()
 Bnames = list(table_links.keys())
 Bnames.sort()
 
+@instrumented
 def get_flux_data(url):
   """
   Gets the latest data from the Michigan database for a source
@@ -69,6 +71,7 @@ def get_flux_data(url):
       sigflux[freq].append(sig_flux)
   return times,fluxes,sigflux
 
+@instrumented
 def polate_flux(Jname,datenum,freq):
   """
   Interpolate or extrapolate flux of source for given date and frequency
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Module parallel_flux evaluates calibrator fluxes for long schedules on all
+the cores of a machine.
+
+A schedule is a sequence of (source, frequency, date) rows, e.g. every scan
+of a semester.  It is cut into chunks which are evaluated with
+``radio_flux.get_calibrator_flux`` in a pool of worker processes.  Each
+worker loads the flux modules and resolves the sources of the schedule
+once, when it starts, instead of once per row or per chunk.  The results
+come back in the order of the schedule::
+
+ In [1]: import datetime
+ In [2]: from Radio_Astronomy.parallel_flux import evaluate_schedule
+ In [3]: date = datetime.datetime(2020, 1, 1)
+ In [4]: rows = [('3C286', 8.4, date), ('Venus', 22., date)]*50000
+ In [5]: fluxes, refs, stats = evaluate_schedule(rows)
+ In [6]: stats['rows_per_s']
+
+The worker processes import this module, so on platforms which spawn
+rather than fork processes the calling script must protect its main code
+with ``if __name__ == '__main__':``.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+default_preload = ['Radio_Astronomy.radio_flux', 'Radio_Astronomy.michigan']
+
+def _load_catalogs(preload, sources):
+  """
+  Import the flux modules and resolve the sources of the schedule
+
+  The michigan module reads its tables when it is imported.  Modules which
+  cannot be loaded are skipped, since a schedule may not need them.  The
+  sources are put in the calibrator cache of radio_flux, which is what
+  get_calibrator_flux looks them up in.
+  """
+  for name in preload:
+    try:
+      __import__(name)
+    except Exception as details:
+      module_logger.warning("_load_catalogs: could not load %s: %s",
+                            name, details)
+  from Radio_Astronomy import radio_flux
+  # more would only push the first ones out of the cache again
+  radio_flux.preload_calibrators(sources[:radio_flux.calibrator_cache_size])
+
+def _worker_init(preload, sources):
+  """
+  Initializer of the worker processes
+  """
+  _load_catalogs(preload, sources)
+  module_logger.debug("_worker_init: process %d ready", os.getpid())
+
+def _evaluate_chunk(rows):
+  """
+  Fluxes and flux origins of a chunk of schedule rows
+  """
+  from Radio_Astronomy.radio_flux import get_calibrator_flux
+  fluxes = numpy.full(len(rows), numpy.nan)
+  refs = []
+  for index, (source, freq, date) in enumerate(rows):
+    # a source without a flux gives None; errors are the caller's to see
+    flux, ref = get_calibrator_flux(source, freq, date)
+    if flux is not None:
+      fluxes[index] = flux
+    refs.append(ref)
+  return fluxes, refs
+
+def _chunks(rows, chunk_size):
+  """
+  Consecutive slices of the schedule
+  """
+  for start in range(0, len(rows), chunk_size):
+    yield rows[start:start+chunk_size]
+
+@instrumented
+def evaluate_schedule(rows, n_workers=None, chunk_size=None,
+                      preload=default_preload):
+  """
+  Calibrator fluxes for every row of a schedule
+
+  @param rows : (source name, frequency in GHz, datetime) for each row
+  @type  rows : sequence of tuples
+
+  @param n_workers : number of worker processes; default: number of cores.
+                     With 1, the rows are evaluated in this process.
+  @type  n_workers : int
+
+  @param chunk_size : rows per task; default: about four tasks per worker
+  @type  chunk_size : int
+
+  @param preload : modules each worker imports when it starts
+  @type  preload : list of str
+
+  Errors from get_calibrator_flux, e.g. for a catalogue name which cannot
+  be resolved, are raised here.
+
+  @return: (array of fluxes in Jy, NaN where unknown;
+            list of flux origins, None where unknown;
+            dict with 'rows', 'chunks', 'workers', 'seconds', 'rows_per_s')
+  """
+  rows = list(rows)
+  if n_workers is None:
+    n_workers = os.cpu_count() or 1
+  if n_workers < 1:
+    raise RuntimeError("evaluate_schedule: need at least one worker")
+  if chunk_size is None:
+    chunk_size = max(1, -(-len(rows)//(4*n_workers)))
+  chunks = list(_chunks(rows, chunk_size))
+  start = time.perf_counter()
+  if n_workers == 1 or len(chunks) <= 1:
+    n_workers = 1
+    results = [_evaluate_chunk(chunk) for chunk in chunks]
+  else:
+    n_workers = min(n_workers, len(chunks))
+    sources = sorted(set(row[0] for row in rows))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_worker_init,
+                             initargs=(list(preload), sources)) as executor:
+      # map() returns the results in the order of the chunks
+      results = list(executor.map(_evaluate_chunk, chunks))
+  duration = time.perf_counter() - start
+  if results:
+    fluxes = numpy.concatenate([result[0] for result in results])
+  else:
+    fluxes = numpy.zeros(0)
+  refs = []
+  for result in results:
+    refs.extend(result[1])
+  stats = {'rows': len(rows), 'chunks': len(chunks), 'workers': n_workers,
+           'seconds': duration,
+           'rows_per_s': len(rows)/duration if duration > 0 else numpy.inf}
+  module_logger.info("evaluate_schedule: %d rows in %.2f s with %d workers"
+                     " (%.0f rows/s)", len(rows), duration, n_workers,
+                     stats['rows_per_s'])
+  return fluxes, refs, stats
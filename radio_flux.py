@@ -9,23 +9,44 @@ The origin of the data is given in the documentation for ``radio_flux``,
 ``galactic_BG``.
 """
 
-from math import exp, pow, log10
+from collections import OrderedDict
+from math import pow
+import logging
+import threading
 import ephem
 import numpy as NP
 from scipy.optimize import leastsq
 
 from Astronomy import Ephem
-from Radio_Astronomy import flux
+from Radio_Astronomy import c, flux, Physics
+from Radio_Astronomy.flux_models import Ekelman_params
+from Radio_Astronomy.instrumentation import instrumented, record_cache
+
+module_logger = logging.getLogger(__name__)
 
 # planets recognized by module ephem
 Planets = ['Jupiter', 'Mars', 'Mercury', 'Moon', 'Neptune', 'Pluto',
            'Saturn', 'Sun', 'Uranus', 'Venus']
+_planet_set = frozenset(Planets)
 diag = False
 
-params = {"Virgo": [6.541, -1.289],
-          "Omega": [4.056, -0.378],
-          "Orion": [3.317, -0.204]}
-
+# Ekelman (1999) coefficients; all the models are in flux_models
+params = Ekelman_params
+
+# galactic and extragalactic background intensity, Zarka et al. (2004)
+Ig = 2.48e-20
+Ieg = 1.06e-20
+# number of frequency grids for which galactic_BG results are kept
+BG_cache_size = 8
+_BG_cache = OrderedDict()
+_BG_lock = threading.Lock()
+# number of resolved calibrators kept by get_calibrator_flux
+calibrator_cache_size = 256
+_calibrator_cache = OrderedDict()
+_calibrator_lock = threading.Lock()
+_calibrator_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+@instrumented
 def radio_flux(source,freq):
   """
   Flux density in Jy of standard calibrators.
@@ -37,14 +58,17 @@ def radio_flux(source,freq):
   @param source : name of the source ('Virgo', 'Omega', or 'Orion')
   @type  source : str
 
+  For many sources at once, or the Perley & Butler (2017) models of 3C
+  sources, see ``flux_models.models.flux``.
+
   @param freq : frequency in GHz
-  @param freq : float
+  @type  freq : float or array of float
 
   @return: the flux density in Jy.
   """
   p1 = params[source][0]
   p2 = params[source][1]
-  return pow(10,(p1+p2*log10(1000*freq)))
+  return NP.power(10.,(p1+p2*NP.log10(1000*NP.asarray(freq))))
 
 def subearth_longitude(pl):
   """
@@ -77,6 +101,7 @@ def err_func(p,x,y,yerr,function):
   #print "fit is",type(fit),"of length",len(fit)
   return (y - function(x,p))/yerr**2
   
+@instrumented
 def planet_brightness(planet, freq):
   """
   Brightness temperature of a planet.
@@ -146,10 +171,14 @@ def planet_brightness(planet, freq):
     sig_Tb = [4.8]
     pass
   
-def get_planet_flux(planet,freq,date):
+@instrumented
+def get_planet_flux(planet,freq,date,beamwidth=None):
   """
   Flux of planet calibrators
 
+  With a beamwidth, the flux is corrected for the dilution of the planet's
+  disk in the beam (see Radio_Astronomy.beam_coupling).
+
   References
   ==========
   The Flux Density of the Strongest Thermal Radio Sources at 14.5 GHz
@@ -164,6 +193,9 @@ def get_planet_flux(planet,freq,date):
   @param date : date and time of observation
   @type  date : datetime.datetime() instance
 
+  @param beamwidth : half-power beamwidth in radians, e.g. from HPBW()
+  @type  beamwidth : float
+
   @return: flux in Jy
   """
   source = planet.capitalize()
@@ -211,8 +243,9 @@ def get_planet_flux(planet,freq,date):
   if diag:
     print("Tb =",Tb, ", radius =", radius)
   # This converts brightness temperature and size to flux.
-  return flux(Tb, freq, diameter)
+  return flux(Tb, freq, diameter, beamwidth)
 
+@instrumented
 def get_calibrator_flux(source, freq, date):
   """
   Get the flux of a calibrator by name, frequency and date.
@@ -223,6 +256,10 @@ def get_calibrator_flux(source, freq, date):
   the flux from that.  Otherwise, it tries to find it in the VLA calibrator
   catalogue.
 
+  What kind of source a name is, and its Ephem.Quasar object, are kept for
+  the last ``calibrator_cache_size`` names, so that repeated scans of a
+  source do not search the catalogues again; see calibrator_cache_info().
+
   It does not yet handle 'B' or 'J-\' IAU names, though that would be a
   trivial extension.  The Michigan catalogue uses 'B' names.
 
@@ -239,56 +276,202 @@ def get_calibrator_flux(source, freq, date):
   """
   if diag:
     print("Processing",source,"for",freq,"GHz at",date.ctime())
-  try:
-    # planet?
-    Planets.index(source)
-    flux = get_planet_flux(source, freq, date)
+  kind, calibrator, lock = _resolve_calibrator(source)
+  if kind == "Planet":
+    flux = get_planet_flux(calibrator, freq, date)
     ref = "Planet"
-  except ValueError:
-    # not a planet
-    if source[1] == 'C' or source[0] == 'J' or source[0] == 'B':
-      calibrator = Ephem.Quasar(source)
-      if diag:
-        print(source,"=",calibrator.Jname,"=",calibrator.Bname)
-      flux = calibrator.get_flux(freq,date)
-      if diag:
-        print(ref,"flux is",flux)
-    else:
-      try:
-        # Maybe its a J name without the J
-        calibrator = Ephem.Quasar(source)
+  elif kind == "Quasar":
+    if diag:
+      print(source,"=",calibrator.Jname,"=",calibrator.Bname)
+    try:
+      # the object is shared with other threads
+      with lock:
         flux = calibrator.get_flux(freq,date)
-        if diag:
-          print(ref,"flux is",flux)
-      except:
-        # Need to handle more cases
-        if diag:
-          print("Could not handle",source)
-        flux = None
-        ref = None
+    except Exception:
+      if _catalogue_name(_normalize_name(source)):
+        raise
+      # Need to handle more cases
+      if diag:
+        print("Could not handle",source)
+      return None, None
+    ref = "Quasar"
+    if diag:
+      print(ref,"flux is",flux)
+  else:
+    # Need to handle more cases
+    if diag:
+      print("Could not handle",source)
+    flux = None
+    ref = None
   return flux, ref
 
+def _normalize_name(name):
+  """
+  A calibrator name as the catalogues write it, e.g. '3C286' for '3c 286'
+  """
+  return "".join(name.split()).upper()
+
+def _catalogue_name(name):
+  """
+  True for names with a 3C, J or B prefix
+  """
+  return name[1:2] == 'C' or name[0:1] == 'J' or name[0:1] == 'B'
+
+def _resolve_calibrator(source):
+  """
+  What kind of calibrator a name is, with its Ephem.Quasar object
+
+  The results for the last ``calibrator_cache_size`` names are kept, so
+  repeated look-ups of a source do not search the catalogues again.  Names
+  are kept without spaces and in upper case, so '3C 286' and '3c286' are
+  one entry.
+
+  @return: ("Planet", planet name, None), ("Quasar", Ephem.Quasar instance,
+           lock) or (None, None, None) if the name was not recognized
+  """
+  key = _normalize_name(source)
+  with _calibrator_lock:
+    entry = _calibrator_cache.get(key)
+    if entry is not None:
+      _calibrator_cache.move_to_end(key)
+      _calibrator_stats['hits'] += 1
+  if entry is not None:
+    record_cache('Radio_Astronomy.radio_flux.get_calibrator_flux', True)
+    return entry
+  record_cache('Radio_Astronomy.radio_flux.get_calibrator_flux', False)
+  if key.capitalize() in _planet_set:
+    entry = ("Planet", key.capitalize(), None)
+  elif _catalogue_name(key):
+    # errors for names which look like catalogue names are not hidden
+    entry = ("Quasar", Ephem.Quasar(key), threading.Lock())
+  else:
+    try:
+      # Maybe its a J name without the J
+      entry = ("Quasar", Ephem.Quasar(key), threading.Lock())
+    except Exception:
+      entry = (None, None, None)
+  with _calibrator_lock:
+    _calibrator_stats['misses'] += 1
+    _calibrator_cache[key] = entry
+    _calibrator_cache.move_to_end(key)
+    while len(_calibrator_cache) > calibrator_cache_size:
+      _calibrator_cache.popitem(last=False)
+      _calibrator_stats['evictions'] += 1
+  return entry
+
+def preload_calibrators(sources):
+  """
+  Resolve calibrator names into the cache used by get_calibrator_flux
+
+  E.g. in a new worker process, before it is given a schedule.  Names which
+  cannot be resolved are logged and skipped; get_calibrator_flux reports
+  them when they are used.
+
+  @param sources : calibrator names
+  @type  sources : iterable of str
+
+  @return: number of names resolved
+  """
+  resolved = 0
+  for source in sources:
+    try:
+      _resolve_calibrator(source)
+    except Exception as details:
+      module_logger.warning("preload_calibrators: %s: %s", source, details)
+    else:
+      resolved += 1
+  return resolved
+
+def calibrator_cache_info():
+  """
+  Statistics of the cache of resolved calibrators
+
+  @return: dict with 'hits', 'misses', 'evictions', 'size' and 'maxsize'
+  """
+  with _calibrator_lock:
+    info = dict(_calibrator_stats)
+    info['size'] = len(_calibrator_cache)
+  info['maxsize'] = calibrator_cache_size
+  return info
+
+def clear_calibrator_cache():
+  """
+  Forget the resolved calibrators and reset the statistics
+  """
+  with _calibrator_lock:
+    _calibrator_cache.clear()
+    for key in _calibrator_stats:
+      _calibrator_stats[key] = 0
+
+def galactic_tau(f):
+  """
+  Optical depth of the Galaxy
+
+  @param f : frequency in MHz
+  @type  f : float or array of float
+  """
+  return 5.0*NP.power(f, -2.1)
+
+def _galactic_BG(f):
+  """
+  Galactic background intensity without caching
+  """
+  tau = galactic_tau(f)
+  exp_tau = NP.exp(-tau)
+  return Ig*NP.power(f, -0.52)*(-NP.expm1(-tau)/tau) \
+         + Ieg*NP.power(f, -0.8)*exp_tau
+
+@instrumented
 def galactic_BG(f):
   """
   Average galactic background temperature
 
   Zarka et al JGR, 109, A09S15 (2004)
 
+  The frequency may be an array of any shape.  The results for the last
+  few arrays are cached so that repeated calls with the same frequency grid
+  cost only a look-up and a copy.
+
   @param f : frequency in MHz
-  @type  f : float
+  @type  f : float or array of float
+
+  @return: intensity in W/m^2/Hz/sr (float or array of float)
+  """
+  f = NP.asarray(f, dtype=float)
+  if f.ndim == 0:
+    return float(_galactic_BG(f))
+  key = (f.shape, f.tobytes())
+  with _BG_lock:
+    result = _BG_cache.get(key)
+    if result is not None:
+      _BG_cache.move_to_end(key)
+  if result is not None:
+    record_cache('Radio_Astronomy.radio_flux.galactic_BG', True)
+    return result.copy()
+  record_cache('Radio_Astronomy.radio_flux.galactic_BG', False)
+  result = _galactic_BG(f)
+  with _BG_lock:
+    _BG_cache[key] = result
+    _BG_cache.move_to_end(key)
+    while len(_BG_cache) > BG_cache_size:
+      _BG_cache.popitem(last=False)
+  return result.copy()
+
+@instrumented
+def galactic_BG_temperature(f):
   """
-  def tau(f):
-    """
-    Optical depth of the Galaxy
+  Brightness temperature of the average galactic background
 
-    @param f : frequency in MHz
-    @type  f : float
-    """
-    return 5.0*f**(-2.1)
+  This is the Rayleigh-Jeans temperature of ``galactic_BG``, which can be
+  added to the system temperature for ``noise_power`` and ``rms_noise``.
 
-  Ig = 2.48e-20
-  Ieg = 1.06e-20
-  return Ig*f**(-0.52)*( (1-exp(-tau(f)))/tau(f) ) + Ieg*f**(-0.8)*exp(-tau(f))
+  @param f : frequency in MHz
+  @type  f : float or array of float
+
+  @return: temperature in K (float or array of float)
+  """
+  nu = NP.asarray(f, dtype=float)*1e6
+  return galactic_BG(f)*c**2/(2*Physics.k*nu**2)
 
 if __name__ == "__main__":
   from pylab import *
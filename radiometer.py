@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Module radiometer simulates total-power radiometer data.
+
+Each sample is the system temperature plus the antenna temperature of the
+source (see ``antenna_temperature``) plus Gaussian noise with the r.m.s. of
+``rms_noise`` for one sample time.  The data are produced in chunks of a
+fixed number of samples so that hours of data take no more memory than one
+chunk::
+
+ In [1]: from Radio_Astronomy.radiometer import RadiometerSimulator
+ In [2]: sim = RadiometerSimulator(lambda t: 2.*(t % 60 < 30), 635.5,
+                                   40., 1e8, sample_rate=1e3, seed=42)
+ In [3]: for times, T in sim.stream(3600.):
+    ...:   process(times, T)
+
+Every chunk has its own random number stream, derived from the seed and
+the chunk number with ``numpy.random.SeedSequence``.  A chunk is therefore
+the same however and in whatever order it is produced, and different
+processes can produce different chunks of one simulation with
+``sim.chunk(n)``.
+"""
+import logging
+
+import numpy
+
+from Radio_Astronomy import antenna_temperature, noise_power, rms_noise
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+class RadiometerSimulator(object):
+  """
+  Total-power radiometer producing data in chunks
+
+  Public attributes::
+    bandwidth      - receiver bandwidth in Hz
+    chunk_size     - samples per chunk
+    effective_area - antenna effective area in m^2
+    sample_rate    - samples per second
+    seed           - seed of the random number streams
+    source         - source flux in Jy, or function of time giving it
+    Tsys           - system temperature in K, or function of time giving it
+  """
+  def __init__(self, source, effective_area, Tsys, bandwidth,
+               sample_rate=1e3, chunk_size=65536, seed=0, start_time=0.):
+    """
+    Create a simulator
+
+    @param source : flux in Jy, or source track: a function which takes an
+                    array of times in sec and returns the fluxes
+    @type  source : float or callable
+
+    @param effective_area : antenna effective area in m^2
+    @type  effective_area : float
+
+    @param Tsys : system temperature in K, or a function of time like source
+    @type  Tsys : float or callable
+
+    @param bandwidth : receiver bandwidth in Hz
+    @type  bandwidth : float
+
+    @param sample_rate : samples per second
+    @type  sample_rate : float
+
+    @param chunk_size : samples per chunk
+    @type  chunk_size : int
+
+    @param seed : seed of the random number streams
+    @type  seed : int
+
+    @param start_time : time of the first sample in sec
+    @type  start_time : float
+    """
+    if chunk_size < 1:
+      raise RuntimeError("chunk_size must be positive")
+    self.source = source
+    self.effective_area = effective_area
+    self.Tsys = Tsys
+    self.bandwidth = bandwidth
+    self.sample_rate = float(sample_rate)
+    self.chunk_size = int(chunk_size)
+    self.seed = seed
+    self.start_time = start_time
+    self._sigma_per_K = rms_noise(1., bandwidth, 1./self.sample_rate)
+
+  def n_chunks(self, duration):
+    """
+    Number of chunks needed for a duration in sec
+    """
+    n_samples = int(round(duration*self.sample_rate))
+    return -(-n_samples//self.chunk_size)
+
+  def _evaluate(self, value, times):
+    if callable(value):
+      return numpy.asarray(value(times), dtype=float)
+    return value
+
+  @instrumented
+  def chunk(self, index, n_samples=None, power=False):
+    """
+    One chunk of data
+
+    @param index : chunk number, from 0
+    @type  index : int
+
+    @param n_samples : samples in the chunk; default: chunk_size
+    @type  n_samples : int
+
+    @param power : return noise powers in W instead of temperatures in K
+    @type  power : bool
+
+    @return: (array of times in sec, array of temperatures in K or powers)
+    """
+    if n_samples is None:
+      n_samples = self.chunk_size
+    first = index*self.chunk_size
+    times = self.start_time \
+            + (first + numpy.arange(n_samples))/self.sample_rate
+    rng = numpy.random.default_rng(
+                numpy.random.SeedSequence(self.seed, spawn_key=(index,)))
+    T = rng.standard_normal(n_samples)
+    Ta = antenna_temperature(self._evaluate(self.source, times),
+                             self.effective_area)
+    Tsys = self._evaluate(self.Tsys, times)
+    # in place: noise*sigma + Tsys + Ta
+    T *= self._sigma_per_K*(Tsys + Ta)
+    T += Tsys
+    T += Ta
+    if power:
+      T *= noise_power(1., self.bandwidth)
+    return times, T
+
+  def stream(self, duration, first_chunk=0, power=False):
+    """
+    Generator of the chunks of a simulation
+
+    The last chunk is shorter if the duration is not a whole number of
+    chunks.
+
+    @param duration : length of the simulation in sec, from start_time
+    @type  duration : float
+
+    @param first_chunk : chunk to start from, e.g. to resume a simulation
+    @type  first_chunk : int
+
+    @param power : yield noise powers in W instead of temperatures in K
+    @type  power : bool
+
+    @return: iterator over (times, data) as returned by chunk()
+    """
+    n_samples = int(round(duration*self.sample_rate))
+    n_chunks = self.n_chunks(duration)
+    module_logger.debug("stream: %d samples in %d chunks", n_samples, n_chunks)
+    for index in range(first_chunk, n_chunks):
+      size = min(self.chunk_size, n_samples - index*self.chunk_size)
+      yield self.chunk(index, size, power)
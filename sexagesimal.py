@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Module sexagesimal converts many formatted angles to radians at once.
+
+The catalogues write positions in several ways::
+
+  00h01m08.621563s  19d14'33.801860"     VLA calibrator list, 3C_VLA_cals
+  00:09:53.6        +25:55:23            masers_H2O_AGN.txt
+  00 09 53.6        +25 55 23
+
+Parsing them one at a time costs a few microseconds per angle in the
+Python code around the string handling.  Here the strings are taken as one
+array of character codes.  Strings with the same layout, differing only in
+their digits, are grouped; the layout is parsed once per group with a
+regular expression, and the digits of the whole group are converted to
+numbers with one matrix product.  A catalogue has a handful of layouts, so
+the Python work does not grow with the number of strings::
+
+ In [1]: from Radio_Astronomy.sexagesimal import parse_angles
+ In [2]: rads, ok = parse_angles(["13h31m08.287984s", "30d30'32.958850\\""])
+
+The unit is taken from the field markers: 'h' means hours, 'd' or a degree
+sign means degrees.  Angles with colons or spaces have no unit marker, so
+their unit must be given.  Strings which do not parse, or have minutes or
+seconds of 60 or more, get NaN and a False in the mask which is returned
+with the values; they are not errors, so one bad line does not stop a
+catalogue from loading.
+"""
+import logging
+import math
+import re
+
+import numpy
+
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+_number = r"\d+(?:\.\d*)?|\.\d+"
+
+def _angle_pattern(prefix):
+  """
+  Regular expression of one angle, with groups named after the prefix
+  """
+  return (r"[ \t]*(?P<{0}sign>[+-]?)(?P<{0}whole>{1})[ \t]*"
+          r"(?P<{0}unit>[hHdD°:]|(?=[ \t]))[ \t]*"
+          r"(?P<{0}min>{1})[ \t]*(?:[mM':]|(?=[ \t])|$)[ \t]*"
+          r"(?P<{0}sec>{1})?[ \t]*(?:[sS]|\"|'')?[ \t]*").format(prefix, _number)
+
+_single = re.compile(_angle_pattern(''))
+
+_pair = re.compile(_angle_pattern('ra_') + "[ \t,]" + _angle_pattern('dec_'))
+
+# codes of the unit markers; angles which do not parse get _bad
+_hours, _degrees, _no_marker, _bad = 1, 2, 3, 0
+_marker_codes = {'h': _hours, 'd': _degrees, '°': _degrees}
+
+def _scan(pattern, prefixes, strings):
+  """
+  Sign, whole degrees or hours, minutes, seconds and marker code of each
+  angle of each string
+
+  Strings which are the same but for their digits, e.g. all those written
+  'DDhDDmDD.DDDDDDs', have their fields in the same places.  The pattern is
+  matched once for each such shape, and the digits of all the strings of
+  that shape are turned into numbers with one matrix product.
+
+  @return: numpy array of shape (strings, 5*angles)
+  """
+  strings = numpy.asarray(strings, dtype=str).ravel()
+  n_strings, width = len(strings), strings.dtype.itemsize//4
+  fields = numpy.zeros((n_strings, 5*len(prefixes)))
+  if n_strings == 0 or width == 0:
+    return fields
+  codes = strings.view(numpy.uint32).reshape(n_strings, width)
+  is_digit = (codes >= ord('0')) & (codes <= ord('9'))
+  digits = numpy.where(is_digit, codes - ord('0'), 0).astype(float)
+  # the shape of a string is the string with every digit made '0'
+  shape_codes = numpy.where(is_digit, ord('0'), codes).astype(numpy.uint32)
+  shapes = shape_codes.view(numpy.dtype((numpy.void, 4*width))).ravel()
+  unique_shapes, shape_index = numpy.unique(shapes, return_inverse=True)
+  order = numpy.argsort(shape_index.ravel(), kind='stable')
+  boundaries = numpy.searchsorted(shape_index.ravel()[order],
+                                  numpy.arange(len(unique_shapes) + 1))
+  for number in range(len(unique_shapes)):
+    rows = order[boundaries[number]:boundaries[number+1]]
+    text = "".join(map(chr, shape_codes[rows[0]])).rstrip("\0")
+    match = pattern.fullmatch(text)
+    if match is None:
+      continue
+    # weights of the digits in the integer values of the numbers, and the
+    # powers of ten to divide those by
+    weights = numpy.zeros((width, 3*len(prefixes)))
+    scales = numpy.ones(3*len(prefixes))
+    constants = []
+    for angle, prefix in enumerate(prefixes):
+      for column, name in enumerate(['whole', 'min', 'sec']):
+        start, end = match.span(prefix + name)
+        number_text = text[start:end] if start >= 0 else ''
+        positions = [start + offset for offset, char in enumerate(number_text)
+                     if char == '0']
+        weights[positions, 3*angle + column] = \
+                        10.**numpy.arange(len(positions) - 1, -1, -1)
+        if '.' in number_text:
+          scales[3*angle + column] = \
+                        10.**(len(number_text) - number_text.index('.') - 1)
+      marker = match.group(prefix + 'unit').lower()
+      constants.append((-1. if match.group(prefix + 'sign') == '-' else 1.,
+                        _marker_codes.get(marker, _no_marker)))
+    values = (digits[rows] @ weights)/scales
+    for angle, (sign, marker) in enumerate(constants):
+      fields[rows, 5*angle] = sign
+      fields[rows, 5*angle+1:5*angle+4] = values[:, 3*angle:3*angle+3]
+      fields[rows, 5*angle+4] = marker
+  return fields
+
+def _combine(fields, unit):
+  """
+  Radians from the sign, degrees/hours, minutes, seconds and marker columns
+
+  A marker decides the unit of its angle; ``unit`` is for angles without.
+
+  @return: (radians, valid, hours) where hours is True for hour angles
+  """
+  sign, whole, minutes, seconds, marker = fields.T
+  marked = (marker == _hours) | (marker == _degrees)
+  hours = numpy.where(marked, marker == _hours, unit == 'hours')
+  valid = (marker != _bad) & (marked | (unit is not None)) \
+          & (minutes < 60) & (seconds < 60)
+  value = sign*(whole + minutes/60. + seconds/3600.)
+  radians = value*numpy.where(hours, math.pi/12., math.pi/180.)
+  radians[~valid] = numpy.nan
+  return radians, valid, hours
+
+def _check_unit(unit):
+  if unit not in (None, 'hours', 'degrees'):
+    raise RuntimeError("unit must be None, 'hours' or 'degrees', not "
+                       + repr(unit))
+
+@instrumented
+def parse_angles(strings, unit=None):
+  """
+  Convert formatted angles to radians
+
+  @param strings : angles like '00h01m08.62s', '19d14\\'33.8"', '-12:06:26'
+  @type  strings : str or array of str
+
+  @param unit : 'hours' or 'degrees' for strings without unit markers;
+                default: such strings are invalid
+  @type  unit : str
+
+  @return: (numpy array of radians, NaN where invalid,
+            numpy array of bool, True where valid)
+  """
+  _check_unit(unit)
+  shape = numpy.shape(strings)
+  fields = _scan(_single, [''], strings)
+  radians, valid, hours = _combine(fields, unit)
+  if not valid.all():
+    module_logger.debug("parse_angles: %d of %d invalid",
+                        (~valid).sum(), len(valid))
+  return radians.reshape(shape), valid.reshape(shape)
+
+@instrumented
+def parse_coordinates(strings, unit=None):
+  """
+  Convert formatted right ascension and declination pairs to radians
+
+  The two angles are separated by spaces or a comma, as in
+  '00:09:53.6 +25:55:23' or '13h31m08.29s, 30d30\\'32.96"'.
+
+  @param strings : coordinate pairs
+  @type  strings : str or array of str
+
+  @param unit : unit of the first angle when it has no markers; the second
+                is always in degrees.  Default: 'hours'
+  @type  unit : str
+
+  @return: (right ascensions in radians, declinations in radians,
+            numpy array of bool, True where both are valid)
+  """
+  _check_unit(unit)
+  shape = numpy.shape(strings)
+  fields = _scan(_pair, ['ra_', 'dec_'], strings)
+  ra, valid, ra_hours = _combine(fields[:, :5], unit or 'hours')
+  dec, dec_valid, dec_hours = _combine(fields[:, 5:], 'degrees')
+  # a declination in hours is a mistake
+  valid &= dec_valid & ~dec_hours
+  ra[~valid] = numpy.nan
+  dec[~valid] = numpy.nan
+  if not valid.all():
+    module_logger.debug("parse_coordinates: %d of %d invalid",
+                        (~valid).sum(), len(valid))
+  return ra.reshape(shape), dec.reshape(shape), valid.reshape(shape)
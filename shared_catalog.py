@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Module shared_catalog puts the VLA calibrator catalogue in shared memory so
+that worker processes can use it without each unpickling ``VLA_cals``,
+``B_names`` and ``3C_names``.
+
+One process publishes the catalogue; the workers attach to it by name::
+
+ # parent
+ In [1]: from Radio_Astronomy.shared_catalog import publish_catalog
+ In [2]: shared = publish_catalog()
+ In [3]: shared.name          # pass this to the workers
+ ...
+ In [9]: shared.unlink()      # when all the workers are done
+
+ # worker
+ In [1]: from Radio_Astronomy.shared_catalog import attach_catalog
+ In [2]: cat = attach_catalog(name)
+ In [3]: cat.get_cal_data('3C273')
+
+Everything is in one shared memory block: a small JSON header describing
+the layout followed by the columns of ``vla_cal.get_cal_columns`` as numpy
+arrays.  Names are fixed-width byte strings, and sorted copies of the J, B
+and 3C names with their row numbers serve as indexes, so a worker needs no
+set-up beyond mapping the block.  Attached arrays are read-only.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from multiprocessing import shared_memory
+
+import numpy
+
+from Radio_Astronomy.instrumentation import instrumented
+from Radio_Astronomy.vla_cal import get_cal_columns
+
+module_logger = logging.getLogger(__name__)
+
+_header_size = struct.calcsize('<Q')
+_alignment = 64
+
+def _catalog_arrays(columns):
+  """
+  Arrays to be shared: the columns, as bytes for names, and name indexes
+  """
+  arrays = {}
+  for key in ['ra', 'dec', 'freqs', 'flux']:
+    arrays[key] = numpy.ascontiguousarray(columns[key], dtype=float)
+  for key in ['jname', 'bname', 'cat3c']:
+    names = numpy.char.encode(columns[key], 'ascii')
+    arrays[key] = names
+    # sorted names and their rows, without the sources lacking such a name
+    rows = numpy.flatnonzero(names != b'')
+    order = rows[numpy.argsort(names[rows], kind='stable')]
+    arrays[key+'_sorted'] = names[order]
+    arrays[key+'_rows'] = order.astype(numpy.int64)
+  return arrays
+
+class _UntrackedBlock(object):
+  """
+  A shared memory block mapped without telling the resource tracker
+
+  Before Python 3.13, SharedMemory registers every block it maps with the
+  resource tracker, even blocks it only attaches to.  The tracker frees
+  its registered blocks when the processes it serves exit, so a worker, or
+  a pool in another process, would free a block its publisher still owns;
+  and unregistering instead would remove the owner's registration when the
+  tracker is shared with it.  This maps the block as SharedMemory does,
+  without the registration.  Only ``name``, ``buf`` and ``close`` are
+  provided, which is all an attached catalogue uses.
+  """
+  def __init__(self, name):
+    import _posixshmem
+    self.name = name
+    fd = _posixshmem.shm_open("/" + name, os.O_RDWR, mode=0o600)
+    try:
+      self._mmap = mmap.mmap(fd, os.fstat(fd).st_size)
+    finally:
+      os.close(fd)
+    self.buf = memoryview(self._mmap)
+
+  def close(self):
+    self.buf.release()
+    self._mmap.close()
+
+class SharedCatalog(object):
+  """
+  Calibrator catalogue in a shared memory block
+
+  Public attributes::
+    name    - name of the shared memory block
+    columns - read-only numpy arrays keyed like get_cal_columns()
+  """
+  def __init__(self, memory, layout, owner):
+    """
+    Wrap a mapped shared memory block; use publish_catalog or attach_catalog
+
+    @param memory : the mapped block
+    @type  memory : multiprocessing.shared_memory.SharedMemory or
+                    _UntrackedBlock instance
+
+    @param layout : offset, dtype and shape of each array, keyed by name
+    @type  layout : dict
+
+    @param owner : True in the process which created the block
+    @type  owner : bool
+    """
+    self._memory = memory
+    self._owner = owner
+    self.name = memory.name
+    self._arrays = {}
+    for key, (offset, dtype, shape) in layout.items():
+      array = numpy.ndarray(tuple(shape), dtype=numpy.dtype(dtype),
+                            buffer=memory.buf, offset=offset)
+      array.flags.writeable = False
+      self._arrays[key] = array
+    self.columns = dict((key, self._arrays[key])
+                        for key in ['jname', 'bname', 'cat3c', 'ra', 'dec',
+                                    'freqs', 'flux'])
+
+  def __len__(self):
+    return len(self._arrays['jname'])
+
+  def find(self, name, kind='jname'):
+    """
+    Row of a source from one of its names
+
+    @param name : name without the 'J' or 'B' prefix, or 3C name
+    @type  name : str
+
+    @param kind : 'jname', 'bname' or 'cat3c'
+    @type  kind : str
+
+    @return: row number (int) or None
+    """
+    names = self._arrays[kind+'_sorted']
+    key = name.encode('ascii')
+    index = int(numpy.searchsorted(names, key))
+    if index < len(names) and names[index] == key:
+      return int(self._arrays[kind+'_rows'][index])
+    return None
+
+  def record(self, row):
+    """
+    Catalogue entry of a row as a dictionary like get_cal_data returns
+
+    Fluxes which get_cal_columns treats as missing (zero) are left out.
+
+    @param row : row number
+    @type  row : int
+
+    @return: dictionary
+    """
+    data = {'ra': float(self._arrays['ra'][row]),
+            'dec': float(self._arrays['dec'][row])}
+    for key in ['bname', 'cat3c']:
+      value = self._arrays[key][row]
+      if value:
+        data[key] = value.decode('ascii')
+    fluxes = self._arrays['flux'][row]
+    for freq, flux in zip(self._arrays['freqs'], fluxes):
+      if not numpy.isnan(flux):
+        data['mm'+str(int(round(300./freq)))] = float(flux)
+    return data
+
+  @instrumented
+  def get_cal_data(self, source):
+    """
+    Calibrator data for a source, like vla_cal.get_cal_data
+
+    Handles JHHMM+DDd, BHHMM+DDd, 3CNNN and unprefixed J or B names.
+
+    @param source : source name
+    @type  source : str
+
+    @return: dictionary or None
+    """
+    if source[0:2].lower() == '3c':
+      row = self.find('3C'+source[2:], 'cat3c')
+    elif source[0].lower() == 'j':
+      row = self.find(source[1:], 'jname')
+    elif source[0].lower() == 'b':
+      row = self.find(source[1:], 'bname')
+    else:
+      row = self.find(source, 'jname')
+      if row is None:
+        row = self.find(source, 'bname')
+    if row is None:
+      module_logger.debug("get_cal_data: no match for %s", source)
+      return None
+    return self.record(row)
+
+  def close(self):
+    """
+    Unmap the block in this process
+
+    Arrays taken from ``columns`` must have been released before this.
+    """
+    self.columns = {}
+    self._arrays = {}
+    self._memory.close()
+
+  def unlink(self):
+    """
+    Unmap the block and free it; only the process which published it
+    should do this, after the workers have finished
+    """
+    self.close()
+    if self._owner:
+      self._memory.unlink()
+
+@instrumented
+def publish_catalog(cal_data=None, name=None):
+  """
+  Copy the calibrator catalogue into a new shared memory block
+
+  @param cal_data : VLA calibrator data dictionary; default: get_cal_dict()
+  @type  cal_data : dictionary of dictionaries
+
+  @param name : name for the block; default: chosen by the system
+  @type  name : str
+
+  @return: SharedCatalog instance
+  """
+  arrays = _catalog_arrays(get_cal_columns(cal_data))
+  layout = {}
+  offset = 0
+  for key, array in arrays.items():
+    layout[key] = [offset, array.dtype.str, list(array.shape)]
+    offset += -(-array.nbytes//_alignment)*_alignment
+  # the header length depends on the offsets, which depend on it
+  start = 0
+  while True:
+    shifted = dict((key, [value[0] + start] + value[1:])
+                   for key, value in layout.items())
+    header = json.dumps(shifted).encode('ascii')
+    needed = -(-(_header_size + len(header))//_alignment)*_alignment
+    if needed <= start:
+      break
+    start = needed
+  layout = shifted
+  size = max(start + offset, start + 1)
+  memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+  struct.pack_into('<Q', memory.buf, 0, len(header))
+  memory.buf[_header_size:_header_size+len(header)] = header
+  for key, array in arrays.items():
+    target = numpy.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf,
+                           offset=layout[key][0])
+    target[...] = array
+  module_logger.info("publish_catalog: %d sources, %d bytes in %s",
+                     len(arrays['jname']), size, memory.name)
+  return SharedCatalog(memory, layout, owner=True)
+
+@instrumented
+def attach_catalog(name):
+  """
+  Map a catalogue published by another process
+
+  @param name : name of the shared memory block (SharedCatalog.name)
+  @type  name : str
+
+  @return: SharedCatalog instance
+  """
+  try:
+    memory = shared_memory.SharedMemory(name=name, create=False, track=False)
+  except TypeError:
+    # before Python 3.13; only POSIX blocks are tracked
+    if os.name == 'posix':
+      memory = _UntrackedBlock(name)
+    else:
+      memory = shared_memory.SharedMemory(name=name, create=False)
+  length, = struct.unpack_from('<Q', memory.buf, 0)
+  layout = json.loads(bytes(memory.buf[_header_size:_header_size+length])
+                      .decode('ascii'))
+  return SharedCatalog(memory, layout, owner=False)
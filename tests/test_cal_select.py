@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Radio_Astronomy.cal_select
+"""
+from math import pi
+
+import numpy
+
+from Radio_Astronomy.cal_select import select_calibrators
+
+def _columns():
+  """
+  Three calibrators near RA 0h, Dec 0 with fluxes of 10, 1 and 0 Jy
+  """
+  return {'jname': numpy.array(['0000+000', '0004+000', '0008+000']),
+          'ra': numpy.array([0., 4., 8.])/60.,
+          'dec': numpy.zeros(3),
+          'freqs': numpy.array([8.4]),
+          'flux': numpy.array([[10.], [1.], [0.]])}
+
+def test_zero_min_SNR():
+  """
+  min_SNR=0 still ranks the calibrators, with the zero-flux one last
+  """
+  for SNR_weight in [0., 0.5]:
+    names, separations, SNRs = select_calibrators(
+                                 [0.2*pi/180], [0.], 8.4, 100., 40., 1e8, 1.,
+                                 n_best=3, min_SNR=0., SNR_weight=SNR_weight,
+                                 columns=_columns())
+    assert list(names[0]) == ['0000+000', '0004+000', '0008+000']
+    assert numpy.isfinite(separations).all()
+    assert SNRs[0, 2] == 0.
+
+def test_min_SNR_ranking_unchanged():
+  """
+  A positive min_SNR still leaves out the calibrators below it
+  """
+  names, separations, SNRs = select_calibrators(
+                               [1.9*pi/180], [0.], 8.4, 100., 40., 1e8, 1.,
+                               n_best=2, min_SNR=1., SNR_weight=0.,
+                               columns=_columns())
+  assert list(names[0]) == ['0004+000', '0000+000']
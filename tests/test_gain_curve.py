@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Radio_Astronomy.gain_curve
+"""
+import numpy
+
+from Radio_Astronomy.bands import frequencies_to_bands
+from Radio_Astronomy.gain_curve import fit_gain_curves, gain_at
+
+def test_degenerate_band_among_good_ones():
+  """
+  A band observed at one elevation gets NaN; the others are still fitted
+  """
+  rng = numpy.random.default_rng(1)
+  n_scans = 200
+  true = numpy.array([0.5, 4e-3, -3e-5])
+  elevation = numpy.concatenate([rng.uniform(10., 85., 2*n_scans),
+                                 numpy.full(n_scans, 45.)])
+  freqs = numpy.repeat([2.3, 8.4, 32.], n_scans)
+  fluxes = numpy.full(3*n_scans, 5.)
+  Ta = fluxes*numpy.polyval(true[::-1], elevation)
+  fit = fit_gain_curves(Ta, elevation, freqs, fluxes=fluxes, degree=2)
+  bands = list(fit['bands'])
+  degenerate = bands.index(frequencies_to_bands(numpy.array([32.]))[0])
+  assert numpy.isnan(fit['coefficients'][degenerate]).all()
+  assert numpy.isnan(fit['rms'][degenerate])
+  for freq in [2.3, 8.4]:
+    band = frequencies_to_bands(numpy.array([freq]))[0]
+    row = bands.index(band)
+    assert numpy.allclose(fit['coefficients'][row], true, rtol=1e-6)
+    assert numpy.isclose(gain_at(fit, band, 60.),
+                         numpy.polyval(true[::-1], 60.))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Radio_Astronomy.shared_catalog
+"""
+import multiprocessing
+import time
+
+from Radio_Astronomy.shared_catalog import attach_catalog, publish_catalog
+
+cal_data = {'0001+192': {'bname': '2358+189', 'ra': 0.0190615,
+                         'dec': 19.2427227, 'mm7': 0.18, 'mm13': 0.25},
+            '1331+305': {'bname': '1328+307', 'cat3c': '3C286',
+                         'ra': 13.5189689, 'dec': 30.5091552, 'mm7': 0.9,
+                         'mm13': 1.4}}
+
+def _read_ra(args):
+  """
+  Attach in a pool worker and read one right ascension
+  """
+  name, source = args
+  catalog = attach_catalog(name)
+  try:
+    return catalog.get_cal_data(source)['ra']
+  finally:
+    catalog.close()
+
+def _run_pool(name, results):
+  """
+  A pool in a process which is not the publisher's, nor a child of it
+  """
+  with multiprocessing.get_context('spawn').Pool(2) as pool:
+    results.extend(pool.map(_read_ra, [(name, '3C286')]*4))
+
+def test_pool_in_another_process(capfd):
+  """
+  The pool's exit does not free the block the publisher still owns
+  """
+  shared = publish_catalog(cal_data)
+  try:
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+      results = manager.list()
+      process = context.Process(target=_run_pool, args=(shared.name, results))
+      process.start()
+      process.join()
+      assert process.exitcode == 0
+      assert list(results) == [13.5189689]*4
+    # the block is still there
+    assert _read_ra((shared.name, '0001+192')) == 0.0190615
+  finally:
+    shared.unlink()
+  time.sleep(0.5)
+  errors = capfd.readouterr().err
+  assert 'leaked' not in errors
+  assert 'Traceback' not in errors
+
+def test_attach_in_publisher(capfd):
+  """
+  Attaching in the publishing process keeps the owner's registration
+  """
+  shared = publish_catalog(cal_data)
+  catalog = attach_catalog(shared.name)
+  assert catalog.get_cal_data('3C286')['bname'] == '1328+307'
+  catalog.close()
+  shared.unlink()
+  # the resource tracker reports errors from its own process
+  time.sleep(0.5)
+  errors = capfd.readouterr().err
+  assert 'KeyError' not in errors
+  assert 'Traceback' not in errors
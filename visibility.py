@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Module visibility computes when calibrators are up at an observatory.
+
+Elevation and azimuth of every source in the VLA calibrator catalogue are
+computed for every time of a grid in one go: the sidereal times are
+computed once for the grid, the trigonometric functions of the source
+positions once for the catalogue, and the hour angle terms are formed from
+them by outer products, so no trigonometric function is evaluated on the
+(sources x times) grid except for the final arcsine and arctangent::
+
+ In [1]: import datetime
+ In [2]: from Radio_Astronomy.visibility import visibility_table, time_grid
+ In [3]: times = time_grid(datetime.datetime(2020, 1, 1), 24., 1.)
+ In [4]: table = visibility_table((-107.6184, 34.0784), times, 15.)
+ In [5]: table['names'][table['up'][:,600]]     # up 10 hours after start
+
+The J2000 positions are precessed to the date of the grid.  Nutation,
+aberration and refraction are ignored, so elevations are good to about a
+hundredth of a degree above the horizon; that is enough to plan a
+session, not to point an antenna.
+"""
+import datetime
+import logging
+import math
+
+import numpy
+
+from Radio_Astronomy import datetime_to_seconds
+from Radio_Astronomy.instrumentation import instrumented
+
+module_logger = logging.getLogger(__name__)
+
+# ratio of the sidereal to the solar day rate
+sidereal_rate = 1.00273790935
+
+def time_grid(start, hours=24., step=1.):
+  """
+  Regular grid of times
+
+  @param start : first time, UT
+  @type  start : datetime.datetime() instance
+
+  @param hours : length of the grid in hours
+  @type  hours : float
+
+  @param step : interval in minutes
+  @type  step : float
+
+  @return: list of datetime.datetime() instances, including the end time
+  """
+  n_steps = int(round(hours*60./step))
+  return [start + datetime.timedelta(minutes=step*index)
+          for index in range(n_steps + 1)]
+
+def julian_dates(times):
+  """
+  Julian dates of UT datetimes
+
+  @param times : dates and times, UT
+  @type  times : datetime.datetime() instance or list of them
+
+  @return: numpy array of float
+  """
+  seconds = numpy.array([datetime_to_seconds(time)
+                         for time in numpy.atleast_1d(times)])
+  return seconds/86400. + 2440587.5
+
+def greenwich_sidereal_time(jd):
+  """
+  Greenwich mean sidereal time in hours
+
+  Uses the expression of the Astronomical Almanac (2000), good to about
+  0.1 s over this century.
+
+  @param jd : Julian dates, UT
+  @type  jd : (numpy array of) float
+
+  @return: numpy array of hours from 0 to 24
+  """
+  return numpy.mod(18.697374558 + 24.06570982441908*(numpy.asarray(jd)
+                                                     - 2451545.0), 24.)
+
+def precess(ra, dec, jd):
+  """
+  Precess J2000 mean positions to the mean equator and equinox of a date
+
+  Uses the IAU 1976 precession angles (Lieske et al. 1977).
+
+  @param ra : J2000 right ascensions in hours
+  @type  ra : array of float
+
+  @param dec : J2000 declinations in degrees
+  @type  dec : array of float
+
+  @param jd : Julian date of the equinox
+  @type  jd : float
+
+  @return: (right ascensions in hours, declinations in degrees)
+  """
+  T = (jd - 2451545.0)/36525.
+  arcsec = math.pi/180./3600.
+  zeta = (2306.2181*T + 0.30188*T*T + 0.017998*T**3)*arcsec
+  z = (2306.2181*T + 1.09468*T*T + 0.018203*T**3)*arcsec
+  theta = (2004.3109*T - 0.42665*T*T - 0.041833*T**3)*arcsec
+  ra_rad = numpy.asarray(ra, dtype=float)*(math.pi/12.)
+  dec_rad = numpy.radians(dec)
+  A = numpy.cos(dec_rad)*numpy.sin(ra_rad + zeta)
+  B = math.cos(theta)*numpy.cos(dec_rad)*numpy.cos(ra_rad + zeta) \
+      - math.sin(theta)*numpy.sin(dec_rad)
+  C = math.sin(theta)*numpy.cos(dec_rad)*numpy.cos(ra_rad + zeta) \
+      + math.cos(theta)*numpy.sin(dec_rad)
+  new_ra = numpy.mod(numpy.arctan2(A, B) + z, 2*math.pi)*(12./math.pi)
+  new_dec = numpy.degrees(numpy.arcsin(numpy.clip(C, -1., 1.)))
+  return new_ra, new_dec
+
+def _site_coordinates(site):
+  """
+  East longitude and latitude in degrees of a site
+
+  A site is an ephem.Observer, or a (longitude, latitude) pair in degrees
+  with longitude positive to the east.
+  """
+  if hasattr(site, 'lat') and hasattr(site, 'lon'):
+    return math.degrees(float(site.lon)), math.degrees(float(site.lat))
+  longitude, latitude = site
+  return float(longitude), float(latitude)
+
+@instrumented
+def visibility_table(site, times, min_elevation=0., ra=None, dec=None,
+                     names=None):
+  """
+  Elevation, azimuth, rising, setting and transit of many sources
+
+  Rise, set and transit times are the first ones after the start of the
+  grid, in hours from it; they are NaN for sources which are always up
+  (rise and set) or never up (all three).
+
+  @param site : observatory; ephem.Observer instance, or (east longitude,
+                latitude) in degrees
+  @type  site : ephem.Observer or (float, float)
+
+  @param times : times of the grid, UT, e.g. from time_grid()
+  @type  times : list of datetime.datetime() instances
+
+  @param min_elevation : elevation in degrees above which a source is up
+  @type  min_elevation : float
+
+  @param ra : J2000 right ascensions in hours; default: VLA calibrators
+  @type  ra : array of float
+
+  @param dec : J2000 declinations in degrees; default: VLA calibrators
+  @type  dec : array of float
+
+  @param names : source names; default: VLA calibrator J names
+  @type  names : array of str
+
+  @return: dictionary with::
+    names       - source names
+    times       - the times
+    elevation   - degrees, shape (sources, times)
+    azimuth     - degrees east of north, shape (sources, times)
+    up          - elevation >= min_elevation, shape (sources, times)
+    rise        - hours after the first time
+    set         - hours after the first time
+    transit     - hours after the first time
+    transit_elevation - degrees
+  """
+  if ra is None or dec is None:
+    from Radio_Astronomy.vla_cal import get_cal_columns
+    columns = get_cal_columns()
+    ra, dec, names = columns['ra'], columns['dec'], columns['jname']
+  longitude, latitude = _site_coordinates(site)
+  times = list(times)
+  jd = julian_dates(times)
+  # positions for the middle of the grid; a day changes them by ~0.1"
+  ra, dec = precess(ra, dec, 0.5*(jd[0] + jd[-1]))
+  lst = numpy.mod(greenwich_sidereal_time(jd) + longitude/15., 24.)
+  # terms of the sources (column) and of the times (row)
+  ra_rad = ra*(math.pi/12.)
+  dec_rad = numpy.radians(dec)
+  sin_dec, cos_dec = numpy.sin(dec_rad)[:,None], numpy.cos(dec_rad)[:,None]
+  cos_ra, sin_ra = numpy.cos(ra_rad)[:,None], numpy.sin(ra_rad)[:,None]
+  lst_rad = lst*(math.pi/12.)
+  cos_lst, sin_lst = numpy.cos(lst_rad)[None,:], numpy.sin(lst_rad)[None,:]
+  sin_lat, cos_lat = math.sin(math.radians(latitude)), \
+                     math.cos(math.radians(latitude))
+  # hour angle H = LST - RA
+  cos_H = cos_lst*cos_ra + sin_lst*sin_ra
+  sin_H = sin_lst*cos_ra - cos_lst*sin_ra
+  sin_alt = sin_lat*sin_dec + cos_lat*cos_dec*cos_H
+  elevation = numpy.degrees(numpy.arcsin(numpy.clip(sin_alt, -1., 1.)))
+  azimuth = numpy.mod(numpy.degrees(numpy.arctan2(
+                                    -cos_dec*sin_H,
+                                    sin_dec*cos_lat - cos_dec*sin_lat*cos_H)),
+                      360.)
+  up = elevation >= min_elevation
+  # rise, set and transit
+  sin_dec, cos_dec = sin_dec[:,0], cos_dec[:,0]
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    cos_H0 = (math.sin(math.radians(min_elevation)) - sin_lat*sin_dec) \
+             /(cos_lat*cos_dec)
+  H0 = numpy.degrees(numpy.arccos(numpy.clip(cos_H0, -1., 1.)))/15.
+  transit = numpy.mod(ra - lst[0], 24.)/sidereal_rate
+  rise = transit - H0/sidereal_rate
+  # the next rising if this one is before the start
+  rise = numpy.where(rise < 0, rise + 24./sidereal_rate, rise)
+  setting = transit + H0/sidereal_rate
+  # the first setting may be before this transit
+  previous = setting - 24./sidereal_rate
+  setting = numpy.where(previous >= 0, previous, setting)
+  never_up = cos_H0 > 1
+  always_up = cos_H0 < -1
+  rise[never_up | always_up] = numpy.nan
+  setting[never_up | always_up] = numpy.nan
+  transit = numpy.where(never_up, numpy.nan, transit)
+  transit_elevation = 90. - numpy.abs(latitude - dec)
+  module_logger.debug("visibility_table: %d sources x %d times",
+                      len(ra), len(times))
+  return {'names': names, 'times': times, 'elevation': elevation,
+          'azimuth': azimuth, 'up': up, 'rise': rise, 'set': setting,
+          'transit': transit, 'transit_elevation': transit_elevation}
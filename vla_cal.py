@@ -32,6 +32,11 @@ If you need all the data for a source then do this
 
 >>> data_dict = get_cal_data(source)
 
+If you need the fluxes of the whole catalogue at some frequency (GHz)
+
+>>> names, freqs, S = get_flux_matrix()
+>>> S22 = interpolate_flux_matrix(freqs, S, 22.)
+
 Notes
 -----
 One source of annoyance is that astronomers do not all or always use the same
@@ -51,10 +56,13 @@ import re
 import struct
 from math import pi
 
+import numpy
+
 from scipy import polyfit, polyval
 
-from Astronomy import formats
 from Radio_Astronomy import cal_dir
+from Radio_Astronomy.instrumentation import instrumented
+from Radio_Astronomy.sexagesimal import parse_angles
 
 module_logger = logging.getLogger(__name__)
 
@@ -92,6 +100,7 @@ def make_3C_file(url='http://www.vla.nrao.edu/astro/calib/manual/csource.html'):
     dbfile.close()
     return True
 
+@instrumented
 def get_3C_coords(name):
     """
     Formatted J2000 right ascension and declination and IAU name
@@ -113,6 +122,7 @@ def get_3C_coords(name):
     dbfile.close()
     return data[name]
 
+@instrumented
 def get_VLA_calibrators(url='http://www.vla.nrao.edu/astro/calib/manual/csource.html'):
   """
   Create a dictionary keyed on J-names of calibrators in the VLA data base.
@@ -145,6 +155,7 @@ def get_VLA_calibrators(url='http://www.vla.nrao.edu/astro/calib/manual/csource.
   n_lines = len(catalog)
 
   cal_data = {}
+  positions = {}
   get_fluxes = False # Get source name and coordinates first
   for i in range(n_lines):
     line = catalog[i].strip('\n')
@@ -174,24 +185,8 @@ def get_VLA_calibrators(url='http://www.vla.nrao.edu/astro/calib/manual/csource.
       data = line.split()
       current_source = data[0]
       cal_data[current_source] = {}
-      try:
-        this_source['ra'] = \
-                        formats.hms_delimited_angle_to_rads(data[3])*12/pi
-      except Exception as details:
-        # This should not happen; quit and diagnose manually
-        module_logger.error("Could not parse RA:", data[3])
-        module_logger.error('in:',line)
-        module_logger.error(details)
-        break
-      try:
-        this_source['dec'] = \
-                        formats.dms_delimited_angle_to_rads(data[4])*180/pi
-      except Exception as details:
-        # This should not happen; quit and diagnose manually
-        module_logger.error("Could not parse decl.:", data[4])
-        module_logger.error("in:",line)
-        module_logger.error(details)
-        break
+      # the coordinates of all the sources are converted after the loop
+      positions[current_source] = data[3:5]
       # check for alternate names
       altname = line[63:].strip()
       if re.search('3C',altname):
@@ -236,6 +231,19 @@ def get_VLA_calibrators(url='http://www.vla.nrao.edu/astro/calib/manual/csource.
         module_logger.debug("in:",line)
         module_logger.debug(details)
         break
+  names = [name for name in positions if name in cal_data]
+  ra, ra_ok = parse_angles([positions[name][0] for name in names], 'hours')
+  dec, dec_ok = parse_angles([positions[name][1] for name in names],
+                             'degrees')
+  for number, name in enumerate(names):
+    if ra_ok[number] and dec_ok[number]:
+      cal_data[name]['ra'] = float(ra[number])*12/pi
+      cal_data[name]['dec'] = float(dec[number])*180/pi
+    else:
+      # a source without a position would break get_cal_columns
+      module_logger.error("Could not parse coordinates of %s: %s; dropped",
+                          name, " ".join(positions[name]))
+      del cal_data[name]
   module_logger.info('{} sources processed'.format(len(cal_data)))
   return cal_data
 
@@ -253,6 +261,7 @@ def make_VLA_pickle_file(cals):
   dbfile.close()
   return True
 
+@instrumented
 def get_cal_dict():
   """
   Returns the VLA calibrator dictionary
@@ -269,6 +278,7 @@ def get_cal_dict():
     dbfile.close()
   return data
 
+@instrumented
 def get_cal_data(source):
   """
   Return calibrator data for a source.
@@ -386,6 +396,7 @@ def IAU_name_parts(name):
   dec_part = name[index:]
   return ra_part,dec_part
 
+@instrumented
 def match_IAU_name(name,name_list):
   """
   Try to match a short IAU name to one in a catalogue
@@ -427,6 +438,7 @@ def match_IAU_name(name,name_list):
   # Went through the whole list without a match
   return None
 
+@instrumented
 def fix_IAU_name(name):
   """
   Handles cases where the IAU designator is too long or too short.
@@ -488,6 +500,7 @@ def Jnames_to_B(Bnames_dict):
     Jnames_dict[v] = k
   return Jnames_dict
 
+@instrumented
 def get_flux_data(src_data):
   """
   Gets flux as a function of frequency for the source
@@ -510,6 +523,7 @@ def get_flux_data(src_data):
     fluxes.append(S[k])
   return f,fluxes
 
+@instrumented
 def interpolate_flux(freqs,fluxes,freq):
   if len(freqs) < 1:
     return None
@@ -518,3 +532,120 @@ def interpolate_flux(freqs,fluxes,freq):
   elif len(freqs) > 1:
     (ar,br)=polyfit(freqs,fluxes,1)
     return polyval([ar,br],freq)
+
+@instrumented
+def get_flux_matrix(cal_data=None):
+  """
+  Source by band flux density matrix for the whole calibrator catalogue
+
+  The ``mmNNN`` entries of every source are placed in a dense array with
+  one row per source and one column per band.  Bands without a flux (or
+  with a zero flux, as in ``get_flux_data``) are NaN.  Together with
+  ``interpolate_flux_matrix`` this allows the whole catalogue to be
+  filtered or ranked with array operations, e.g.::
+
+   In [1]: from Radio_Astronomy.vla_cal import *
+   In [2]: names, freqs, S = get_flux_matrix()
+   In [3]: S22 = interpolate_flux_matrix(freqs, S, 22.)
+   In [4]: names[S22 > 1]
+
+  @param cal_data : VLA calibrator data dictionary; default: get_cal_dict()
+  @type  cal_data : dictionary of dictionaries
+
+  @return: (array of J names, array of freqs in GHz, 2D array of fluxes in Jy)
+  """
+  if cal_data is None:
+    cal_data = get_cal_dict()
+  names = list(cal_data.keys())
+  names.sort()
+  bands = set()
+  for name in names:
+    for key in cal_data[name]:
+      if key[0:2] == "mm":
+        bands.add(int(key[2:]))
+  # highest wavelength is lowest frequency
+  bands = sorted(bands, reverse=True)
+  column = {}
+  for index in range(len(bands)):
+    column["mm"+str(bands[index])] = index
+  fluxes = numpy.full((len(names), len(bands)), numpy.nan)
+  for row in range(len(names)):
+    for key, value in cal_data[names[row]].items():
+      if key in column and value != None and value != 0.0:
+        fluxes[row, column[key]] = value
+  freqs = 300./numpy.array(bands, dtype=float)
+  return numpy.array(names), freqs, fluxes
+
+@instrumented
+def interpolate_flux_matrix(freqs, fluxes, freq):
+  """
+  Flux densities of all the sources in a flux matrix at given frequencies
+
+  This is the array version of ``interpolate_flux``.  For each row a
+  straight line is fitted by least squares through the bands that have a
+  flux and evaluated at ``freq``.  A row with only one flux returns that
+  flux and a row with none returns NaN.
+
+  @param freqs : band frequencies in GHz, as from ``get_flux_matrix``
+  @type  freqs : 1D numpy array of float
+
+  @param fluxes : source by band fluxes, NaN where missing
+  @type  fluxes : 2D numpy array of float
+
+  @param freq : frequency (or frequencies) in GHz
+  @type  freq : float or 1D array of float
+
+  @return: array of fluxes, one per source (and per frequency)
+  """
+  valid = ~numpy.isnan(fluxes)
+  n = valid.sum(axis=1)
+  x = numpy.where(valid, freqs, 0.)
+  y = numpy.where(valid, fluxes, 0.)
+  with numpy.errstate(invalid='ignore', divide='ignore'):
+    x_mean = x.sum(axis=1)/n
+    y_mean = y.sum(axis=1)/n
+    dx = numpy.where(valid, freqs - x_mean[:,numpy.newaxis], 0.)
+    dy = numpy.where(valid, fluxes - y_mean[:,numpy.newaxis], 0.)
+    slope = (dx*dy).sum(axis=1)/(dx*dx).sum(axis=1)
+  # a single flux is used as is
+  slope[n == 1] = 0.
+  freq = numpy.asarray(freq, dtype=float)
+  if freq.ndim == 0:
+    return y_mean + slope*(freq - x_mean)
+  else:
+    return y_mean[:,numpy.newaxis] \
+           + slope[:,numpy.newaxis]*(freq - x_mean[:,numpy.newaxis])
+
+@instrumented
+def get_cal_columns(cal_data=None):
+  """
+  Calibrator catalogue as columns of arrays
+
+  The keys are::
+    jname - J name (str)
+    bname - B name, '' if there is none (str)
+    cat3c - 3C name, '' if there is none (str)
+    ra    - J2000 right ascension in hours
+    dec   - J2000 declination in degrees
+    freqs - band frequencies in GHz (one per column of 'flux')
+    flux  - source by band fluxes in Jy, NaN where missing
+
+  All but 'freqs' have one entry (or row) per source, in the order of
+  'jname', which is sorted.
+
+  @param cal_data : VLA calibrator data dictionary; default: get_cal_dict()
+  @type  cal_data : dictionary of dictionaries
+
+  @return: dictionary of numpy arrays
+  """
+  if cal_data is None:
+    cal_data = get_cal_dict()
+  names, freqs, fluxes = get_flux_matrix(cal_data)
+  columns = {'jname': names, 'freqs': freqs, 'flux': fluxes}
+  for key in ['bname', 'cat3c']:
+    columns[key] = numpy.array([cal_data[name].get(key, '') for name in names],
+                               dtype=str)
+  for key in ['ra', 'dec']:
+    columns[key] = numpy.array([cal_data[name][key] for name in names],
+                               dtype=float)
+  return columns